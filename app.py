@@ -2,7 +2,17 @@ import streamlit as st
 import pandas as pd
 from pathlib import Path
 from datetime import date, datetime
-import base64, io
+from functools import partial
+import base64, json, os, re
+from collections import OrderedDict
+
+from doc_library import DocLibrary, DocRegistry, doc_bytes, doc_digest, doc_source
+from blobs import BLOBS
+from export_jobs import submit_export
+from package_pdf import DEFAULT_PROFILE, EXPORT_PROFILES, build_package_pdf, package_inputs
+from rollup import UOP_ITEMS, compute_rollup
+from store import LedgerStore
+from thumbnails import THUMBNAILS
 
 st.set_page_config(page_title="Closing Equity Injection", layout="wide")
 
@@ -155,13 +165,29 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ── CONSTANTS ─────────────────────────────────────────────────────────────────
-LOAN_NAME       = "Moving Company LLC"
-LOAN_AMOUNT     = 1_000_000.00
-EQUITY_REQUIRED = 100_000.00
+# Seeded into an empty store together with demo_data.csv. Its documents are
+# the top-level invoices/ and statements/ folders from generate_examples.py.
+DEMO_LOAN = {
+    "loan_id":         "moving-company-llc",
+    "name":            "Moving Company LLC",
+    "loan_amount":     1_000_000.00,
+    "equity_required": 100_000.00,
+}
+# Every other loan keeps its documents in loans/<loan_id>/
+LOANS_DIR          = Path("loans")
+# Recently used loans whose session state is kept for instant switching
+LOAN_CACHE_SIZE    = int(os.environ.get("EQUITY_LOAN_CACHE_SIZE", 8))
+# Loan document indexes kept per process
+LIBRARY_CACHE_SIZE = int(os.environ.get("EQUITY_LIBRARY_CACHE_SIZE", 64))
 
 STATUS_OPTIONS = ["Pending", "Approved", "Rejected"]
 MAX_DOC_COLS   = 5
-UOP_ITEMS      = ["Working Capital", "Leasehold Improvements", "FF&E", "M&E", "Closing Costs"]
+# Ledger rows drawn per rerun; the rest are reached with the page controls
+LEDGER_PAGE_SIZE = 25
+
+# Thumbnails are served as cacheable static URLs when static serving is on
+# (.streamlit/config.toml); otherwise they fall back to inline data URIs.
+STATIC_THUMBS  = bool(st.get_option("server.enableStaticServing"))
 
 # ── FILE HELPERS ──────────────────────────────────────────────────────────────
 def parse_month(fname: str) -> str:
@@ -181,36 +207,25 @@ def acct_num_from_folder(folder: str) -> str:
     parts = folder.split("_")
     return f"****{parts[-1]}" if len(parts) >= 2 else folder
 
-def make_thumbnail(data: bytes, max_w: int = 150, max_h: int = 165):
-    try:
-        from PIL import Image
-        img = Image.open(io.BytesIO(data))
-        img.thumbnail((max_w, max_h), Image.LANCZOS)
-        buf = io.BytesIO()
-        img.save(buf, format="PNG")
-        b64 = base64.b64encode(buf.getvalue()).decode()
-        return f"data:image/png;base64,{b64}"
-    except Exception:
+def get_thumbnail(fd: dict):
+    # Content hashes are memoised per file version, so a warm rerun reads no
+    # document bytes at all; they are only loaded to render a missing thumbnail.
+    digest = doc_digest(fd)
+    load   = partial(doc_bytes, fd)
+    if STATIC_THUMBS:
+        return THUMBNAILS.url(digest=digest, load=load)
+    png = THUMBNAILS.get(digest=digest, load=load)
+    if png is None:
         return None
-
-def get_thumbnail(fname: str, data: bytes):
-    if fname not in st.session_state.thumbnails:
-        st.session_state.thumbnails[fname] = make_thumbnail(data)
-    return st.session_state.thumbnails[fname]
-
-def find_file(file_list: list, name: str):
-    for f in file_list:
-        if f["name"] == name:
-            return f
-    return None
+    return f"data:image/png;base64,{base64.b64encode(png).decode()}"
 
 def file_ext_badge(fname: str) -> str:
     ext = fname.rsplit(".", 1)[-1].upper() if "." in fname else "FILE"
     return f'<div class="file-ext-badge">{ext}</div>'
 
-def doc_card_html(fname: str, data=None, card_class: str = "doc-card") -> str:
-    if data:
-        thumb = get_thumbnail(fname, data)
+def doc_card_html(fname: str, fd=None, card_class: str = "doc-card") -> str:
+    if fd:
+        thumb = get_thumbnail(fd)
         inner = (
             f'<img src="{thumb}" style="max-width:100%;max-height:158px;'
             f'object-fit:contain;border-radius:3px;margin-bottom:4px">'
@@ -227,6 +242,13 @@ def doc_card_html(fname: str, data=None, card_class: str = "doc-card") -> str:
         f'</div>'
     )
 
+def doc_viewer(fd: dict, key: str):
+    # st.image reads the whole file on every run that builds it, and a
+    # collapsed expander is still built, so the image exists only while the
+    # toggle is on
+    if st.toggle("View", key=f"view_{key}"):
+        st.image(doc_source(fd), use_container_width=True)
+
 def col_label(text: str) -> str:
     return (
         f"<div style='font-size:0.78rem;font-weight:700;color:#6c757d;"
@@ -235,303 +257,32 @@ def col_label(text: str) -> str:
     )
 
 # ── PDF PACKAGE EXPORT ────────────────────────────────────────────────────────
-def _load_pkg_fonts():
-    from PIL import ImageFont
-    candidates = [
-        "/System/Library/Fonts/Helvetica.ttc",
-        "/System/Library/Fonts/Arial.ttf",
-        "/Library/Fonts/Arial.ttf",
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-    ]
-    def _try(size):
-        for fp in candidates:
-            try:
-                return ImageFont.truetype(fp, size)
-            except Exception:
-                continue
-        try:
-            return ImageFont.load_default(size=size)
-        except Exception:
-            return ImageFont.load_default()
-    return {
-        "title": _try(30),
-        "lg":    _try(24),
-        "md":    _try(19),
-        "sm":    _try(15),
-        "xs":    _try(12),
-    }
-
-def apply_watermark(img, text: str = "DRAFT - FOR REVIEW ONLY") -> "Image":
-    from PIL import Image, ImageDraw, ImageFont
-    import math
-
-    F = _load_pkg_fonts()
-    PAGE_W, PAGE_H = img.size
-
-    # Create transparent RGBA overlay the same size as the page
-    overlay = Image.new("RGBA", (PAGE_W, PAGE_H), (0, 0, 0, 0))
-    od = ImageDraw.Draw(overlay)
-
-    # Render watermark text onto a temporary wide canvas, then rotate
-    wm_font = F["title"]
-    try:
-        bbox = od.textbbox((0, 0), text, font=wm_font)
-        tw = bbox[2] - bbox[0]
-        th = bbox[3] - bbox[1]
-    except Exception:
-        tw, th = 700, 40
-
-    # Build a temp canvas sized to the text, draw text, rotate 45°
-    tmp = Image.new("RGBA", (tw + 40, th + 20), (0, 0, 0, 0))
-    td  = ImageDraw.Draw(tmp)
-    td.text((20, 10), text, font=wm_font, fill=(180, 0, 0, 90))
-    rotated = tmp.rotate(45, expand=True)
-
-    # Tile the rotated stamp across the page with spacing
-    rw, rh = rotated.size
-    x_step = int(rw * 1.1)
-    y_step = int(rh * 1.1)
-    x_start = -rw
-    y_start = -rh
-    x = x_start
-    while x < PAGE_W + rw:
-        y = y_start
-        while y < PAGE_H + rh:
-            overlay.paste(rotated, (x, y), rotated)
-            y += y_step
-        x += x_step
-
-    # Composite overlay onto a copy of the original page
-    base = img.convert("RGBA")
-    combined = Image.alpha_composite(base, overlay)
-    return combined.convert("RGB")
-
-
-def build_package_pdf(watermark: bool = False) -> bytes:
-    from PIL import Image, ImageDraw
-    import io as _io
-
-    PAGE_W, PAGE_H = 1200, 1650
-    MARGIN  = 60
-    BANNER_H = 130          # slightly taller to fit closer notes line
-    BG           = (255, 255, 255)
-    BANNER_BG    = (13, 110, 253)
-    BANNER_FG    = (255, 255, 255)
-    NOTES_FG     = (180, 210, 255)   # lighter blue for closer notes in banner
-    TEXT_C       = (33, 37, 41)
-    MUTED_C      = (108, 117, 125)
-    GREEN_C      = (25, 135, 84)
-    RED_C        = (220, 53, 69)
-    DIVIDER_C    = (222, 226, 230)
-
-    F = _load_pkg_fonts()
-    pages = []
-
-    # ── PAGE 1: LEDGER ────────────────────────────────────────────────────────
-    img  = Image.new("RGB", (PAGE_W, PAGE_H), BG)
-    draw = ImageDraw.Draw(img)
-    y = MARGIN
-
-    draw.text((MARGIN, y), "Closing Equity Injection", font=F["title"], fill=TEXT_C)
-    y += 42
-    draw.text(
-        (MARGIN, y),
-        f"Loan: {LOAN_NAME}   |   Loan Amount: ${LOAN_AMOUNT:,.0f}"
-        f"   |   Equity Required: ${EQUITY_REQUIRED:,.0f}",
-        font=F["xs"], fill=MUTED_C,
+def export_inputs() -> dict:
+    """Snapshot the ledger and the attached documents' locations for one export.
+
+    Runs on the script thread but reads no document bytes; build_package_pdf
+    loads each file on its background thread as it reaches the page. The
+    result holds no session-state references.
+    """
+    def _loader(fd):
+        return partial(doc_bytes, fd) if fd else None
+    return package_inputs(
+        st.session_state.loan, st.session_state.ledger,
+        {idx: get_sourcing(idx) for idx in st.session_state.ledger.index},
+        lambda name: _loader(docs_reg.invoice(name)),
+        lambda name: _loader(docs_reg.statement(name)),
+        rollup=ledger_rollup(),
     )
-    y += 28
-    draw.line([(MARGIN, y), (PAGE_W - MARGIN, y)], fill=DIVIDER_C, width=2)
-    y += 18
-
-    # Table column widths and headers
-    CW    = [50, 220, 105, 195, 115, 120, 120, 75]
-    HEADS = ["#", "Funds Used For", "Date", "Vendor Name", "Amount", "Account#", "Invoice#", "Sourced"]
-    x = MARGIN
-    for h, w in zip(HEADS, CW):
-        draw.text((x, y), h.upper(), font=F["xs"], fill=MUTED_C)
-        x += w
-    y += 20
-    draw.line([(MARGIN, y), (PAGE_W - MARGIN, y)], fill=DIVIDER_C, width=1)
-    y += 10
-
-    df = st.session_state.ledger
-    total_amount, sourced_amount, _, _ = compute_totals()
-
-    for row_num, (_, row) in enumerate(df.iterrows(), 1):
-        x     = MARGIN
-        cells = [
-            str(row_num),
-            str(row["Funds Used For"])[:30],
-            str(row["Date"]),
-            str(row["Vendor Name"])[:26],
-            f"${float(row['Amount']):,.2f}",
-            str(row["Bank Account#"]),
-            str(row["Invoice#"]),
-            "Yes" if row["Sourced"] else "No",
-        ]
-        colors = [MUTED_C] + [TEXT_C] * 6 + [GREEN_C if row["Sourced"] else RED_C]
-        for cell, w, color in zip(cells, CW, colors):
-            draw.text((x, y), cell, font=F["sm"], fill=color)
-            x += w
-        y += 26
-        draw.line([(MARGIN, y - 5), (PAGE_W - MARGIN, y - 5)], fill=(240, 240, 240), width=1)
-
-    y += 8
-    draw.line([(MARGIN, y), (PAGE_W - MARGIN, y)], fill=DIVIDER_C, width=2)
-    y += 14
-
-    # Totals - shift right by the new "#" column width
-    tx = MARGIN + CW[0] + CW[1] + CW[2]
-    draw.text((tx, y),        "Total Amount",  font=F["md"], fill=TEXT_C)
-    draw.text((tx + CW[3], y), f"${total_amount:,.2f}", font=F["md"], fill=TEXT_C)
-    y += 30
-    draw.text((tx, y),        "Total Sourced", font=F["md"], fill=TEXT_C)
-    draw.text((tx + CW[3], y), f"${sourced_amount:,.2f}", font=F["md"], fill=GREEN_C)
-
-    pages.append(apply_watermark(img) if watermark else img)
-
-    # ── PAGE 2: UOP ROLL-UP ───────────────────────────────────────────────────
-    img2  = Image.new("RGB", (PAGE_W, PAGE_H), BG)
-    draw2 = ImageDraw.Draw(img2)
-    y2 = MARGIN
-
-    draw2.text((MARGIN, y2), "Use of Proceeds Roll-up", font=F["title"], fill=TEXT_C)
-    y2 += 42
-    draw2.text((MARGIN, y2), f"Loan: {LOAN_NAME}   |   Equity Required: ${EQUITY_REQUIRED:,.0f}",
-               font=F["xs"], fill=MUTED_C)
-    y2 += 28
-    draw2.line([(MARGIN, y2), (PAGE_W - MARGIN, y2)], fill=DIVIDER_C, width=2)
-    y2 += 18
-
-    RCW2   = [50, 240, 160, 160, 200, 130]
-    RHEAD2 = ["#", "UOP Item", "Total Sourced", "EI Outstanding", "Total EI Available", "Fully Sourced"]
-    rx = MARGIN
-    for h, w in zip(RHEAD2, RCW2):
-        draw2.text((rx, y2), h.upper(), font=F["xs"], fill=MUTED_C)
-        rx += w
-    y2 += 20
-    draw2.line([(MARGIN, y2), (PAGE_W - MARGIN, y2)], fill=DIVIDER_C, width=1)
-    y2 += 10
-
-    uop_df = st.session_state.ledger
-    assigned2 = uop_df[uop_df.get("UOP Item", pd.Series(dtype=str)).isin(UOP_ITEMS)] if "UOP Item" in uop_df.columns else pd.DataFrame()
-    rollup2 = []
-    for uop_item in UOP_ITEMS:
-        grp = assigned2[assigned2["UOP Item"] == uop_item] if not assigned2.empty else pd.DataFrame()
-        if grp.empty:
-            continue
-        ts = grp.loc[grp["Sourced"], "Amount"].sum()
-        ta = grp["Amount"].sum()
-        ei_out = ta - ts
-        rollup2.append((uop_item, ts, ei_out, ta, "Yes" if ei_out <= 0 else "No"))
-
-    for r_num, (uop_item, ts, ei_out, ei_avail, fs) in enumerate(rollup2, 1):
-        rx = MARGIN
-        cells2 = [str(r_num), uop_item, f"${ts:,.2f}", f"${ei_out:,.2f}", f"${ei_avail:,.2f}", fs]
-        colors2 = [MUTED_C, TEXT_C, GREEN_C, RED_C if ei_out > 0 else GREEN_C, TEXT_C,
-                   GREEN_C if fs == "Yes" else RED_C]
-        for cell, w, color in zip(cells2, RCW2, colors2):
-            draw2.text((rx, y2), cell, font=F["sm"], fill=color)
-            rx += w
-        y2 += 26
-        draw2.line([(MARGIN, y2 - 5), (PAGE_W - MARGIN, y2 - 5)], fill=(240, 240, 240), width=1)
-
-    y2 += 8
-    draw2.line([(MARGIN, y2), (PAGE_W - MARGIN, y2)], fill=DIVIDER_C, width=2)
-    y2 += 14
-    # Totals
-    tx2 = MARGIN + RCW2[0]
-    draw2.text((tx2, y2), "Totals", font=F["md"], fill=TEXT_C)
-    draw2.text((tx2 + RCW2[1], y2), f"${sum(r[1] for r in rollup2):,.2f}", font=F["md"], fill=GREEN_C)
-    ei_tot2 = sum(r[2] for r in rollup2)
-    draw2.text((tx2 + RCW2[1] + RCW2[2], y2), f"${ei_tot2:,.2f}",
-               font=F["md"], fill=GREEN_C if ei_tot2 <= 0 else RED_C)
-    draw2.text((tx2 + RCW2[1] + RCW2[2] + RCW2[3], y2), f"${sum(r[3] for r in rollup2):,.2f}",
-               font=F["md"], fill=TEXT_C)
-
-    pages.append(apply_watermark(img2) if watermark else img2)
-    for row_num, (idx, row) in enumerate(df.iterrows(), 1):
-        sourcing   = get_sourcing(idx)
-        item_label = (
-            f"{row_num}. {row['Vendor Name']}  -  {row['Funds Used For']}"
-            f"   |   ${float(row['Amount']):,.2f}   |   {row['Date']}"
-        )
-
-        docs = []
-        inv_name = sourcing.get("invoice_file_name")
-        if inv_name:
-            inv_f = find_file(all_invoices, inv_name)
-            inv_notes = sourcing.get("invoice_notes", "").strip()
-            docs.append(("Invoice", inv_f["data"] if inv_f else None, inv_notes))
-        for j, sname in enumerate(sourcing.get("statements", []), 1):
-            sf = find_file(all_statements, sname)
-            stmt_notes = (sourcing.get("statement_notes") or [""])[j-1] if j-1 < len(sourcing.get("statement_notes") or []) else ""
-            stmt_notes = stmt_notes.strip()
-            docs.append((f"Statement {j}", sf["data"] if sf else None, stmt_notes))
-
-        if not docs:
-            docs = [("No Documents Attached", None, "")]
-
-        for doc_type, doc_data, closer_notes in docs:
-            pg   = Image.new("RGB", (PAGE_W, PAGE_H), BG)
-            draw = ImageDraw.Draw(pg)
-
-            # Banner
-            draw.rectangle([(0, 0), (PAGE_W, BANNER_H)], fill=BANNER_BG)
-            draw.text((MARGIN, 14),  item_label[:95], font=F["sm"], fill=BANNER_FG)
-            draw.text((MARGIN, 44),  doc_type,        font=F["lg"], fill=BANNER_FG)
-            # Closer notes beneath doc_type title
-            if closer_notes:
-                draw.text((MARGIN, 82), closer_notes[:120], font=F["sm"], fill=NOTES_FG)
-
-            # Document body
-            if doc_data:
-                try:
-                    doc_img  = Image.open(_io.BytesIO(doc_data)).convert("RGB")
-                    avail_w  = PAGE_W - 2 * MARGIN
-                    avail_h  = PAGE_H - BANNER_H - 2 * MARGIN
-                    doc_img.thumbnail((avail_w, avail_h), Image.LANCZOS)
-                    x_off    = MARGIN + (avail_w - doc_img.width) // 2
-                    pg.paste(doc_img, (x_off, BANNER_H + MARGIN))
-                except Exception:
-                    draw.text((MARGIN, BANNER_H + MARGIN + 40),
-                              "[Could not load document image]", font=F["md"], fill=MUTED_C)
-            else:
-                msg_y = (PAGE_H + BANNER_H) // 2 - 20
-                draw.text((MARGIN, msg_y),
-                          "No document file available for this item.",
-                          font=F["md"], fill=MUTED_C)
-
-            pages.append(apply_watermark(pg) if watermark else pg)
-
-    buf = _io.BytesIO()
-    pages[0].save(buf, format="PDF", save_all=True, append_images=pages[1:])
-    return buf.getvalue()
 
 # ── LOAD LOCAL DEMO FILES ─────────────────────────────────────────────────────
-@st.cache_data(show_spinner=False)
-def load_local_files():
-    inv_files, stmt_files, stmt_by_acct = [], [], {}
-    inv_dir = Path("invoices")
-    if inv_dir.exists():
-        for f in sorted(inv_dir.glob("*.png")):
-            inv_files.append({"name": f.name, "data": f.read_bytes(),
-                               "type": "image/png", "account": None})
-    stmt_dir = Path("statements")
-    if stmt_dir.exists():
-        for acct_dir in sorted(stmt_dir.iterdir()):
-            if not acct_dir.is_dir():
-                continue
-            acct_files = []
-            for f in sorted(acct_dir.glob("*.png")):
-                fd = {"name": f.name, "data": f.read_bytes(),
-                      "type": "image/png", "account": acct_dir.name}
-                stmt_files.append(fd)
-                acct_files.append(fd)
-            if acct_files:
-                stmt_by_acct[acct_dir.name] = acct_files
-    return inv_files, stmt_files, stmt_by_acct
+@st.cache_resource(show_spinner=False, max_entries=LIBRARY_CACHE_SIZE)
+def load_local_files(root: str):
+    # Index only (name, path, size, mtime); shared by all sessions and kept
+    # current by polling, so files dropped into the folders show up on rerun
+    return DocLibrary(root, on_change=THUMBNAILS.discard)
+
+def loan_doc_root(loan_id: str) -> str:
+    return "." if loan_id == DEMO_LOAN["loan_id"] else str(LOANS_DIR / loan_id)
 
 # ── SESSION STATE INIT ────────────────────────────────────────────────────────
 @st.cache_data
@@ -550,89 +301,272 @@ def load_ledger():
         return pd.DataFrame(columns=["Funds Used For", "Date", "Vendor Name",
                                      "Amount", "Bank Account#", "Invoice#", "Sourced", "UOP Item"])
 
+def loan_state_defaults() -> dict:
+    """Per-loan session keys, parked in loan_cache while another loan is open."""
+    return {
+        "ledger":            None,
+        "ledger_version":    0,
+        "rollup":            None,   # (ledger_version, compute_rollup result)
+        "docs":              None,
+        "sourcing":          {},
+        "sourcing_saved":    {},     # row -> JSON last written to the store
+        "ledger_page":       0,
+        "open_item":         None,   # row ID of the open sourcing item
+        "initial_state_set": False,
+        "package_approved":  False,
+        "export_jobs":       {},
+        "draft_pdf":         None,
+        "final_pdf":         None,
+    }
+
+# Widget state tied to one loan's rows; dropped when switching loans
+LOAN_WIDGET_PREFIXES = (
+    "inv_sel_", "inv_status_", "inv_notes_", "stmt_status_", "stmt_notes_", "acct_sel_",
+    "stmt_sel_", "sourced_sel_", "show_req_", "uop_", "view_", "approval_checkbox",
+)
+
 for _k, _v in [
-    ("ledger",            None),
-    ("auto_invoices",     None),
-    ("auto_statements",   None),
-    ("stmts_by_acct",     None),
-    ("user_invoices",     []),
-    ("user_statements",   []),
-    ("sourcing",          {}),
-    ("thumbnails",        {}),
+    *loan_state_defaults().items(),
+    ("loan",              None),
+    ("loan_cache",        OrderedDict()),   # loan_id -> parked per-loan state
     ("show_add_form",     False),
-    ("initial_state_set", False),
-    ("package_approved",  False),
 ]:
     if _k not in st.session_state:
         st.session_state[_k] = _v
 
-if st.session_state.ledger is None:
-    st.session_state.ledger = load_ledger()
-
-if st.session_state.auto_invoices is None:
-    _inv, _stmts, _by_acct = load_local_files()
-    st.session_state.auto_invoices   = _inv
-    st.session_state.auto_statements = _stmts
-    st.session_state.stmts_by_acct  = _by_acct
-
-all_invoices   = st.session_state.auto_invoices   + st.session_state.user_invoices
-all_statements = st.session_state.auto_statements + st.session_state.user_statements
+@st.cache_resource(show_spinner=False)
+def get_store():
+    # One connection per process, shared by every session
+    return LedgerStore()
+
+store = get_store()
+
+def activate_loan(new_id: str):
+    """Make ``new_id`` the open loan, restoring its state if it was used recently."""
+    cur = st.session_state.loan
+    if cur is not None and cur["loan_id"] == new_id:
+        return
+    cache = st.session_state.loan_cache
+    if cur is not None:
+        save_sourcing(st.session_state.open_item)
+        cache[cur["loan_id"]] = {
+            k: st.session_state.get(k, v) for k, v in loan_state_defaults().items()
+        }
+    for k in [k for k in st.session_state if str(k).startswith(LOAN_WIDGET_PREFIXES)]:
+        del st.session_state[k]
+    for k, v in (cache.pop(new_id, None) or loan_state_defaults()).items():
+        st.session_state[k] = v
+    # Evicted loans are simply reloaded from the store next time
+    while len(cache) > LOAN_CACHE_SIZE:
+        cache.popitem(last=False)
+    st.session_state.loan = store.get_loan(new_id)
+
+def switch_loan():
+    activate_loan(st.session_state.loan_sel)
+
+loans = store.list_loans()
+if not loans:
+    store.ensure_loan(**DEMO_LOAN)
+    store.replace_ledger(DEMO_LOAN["loan_id"], load_ledger())
+    loans = store.list_loans()
+if st.session_state.loan is None:
+    st.session_state.loan = next(
+        (l for l in loans if l["loan_id"] == DEMO_LOAN["loan_id"]), loans[0]
+    )
+loan    = st.session_state.loan
+loan_id = loan["loan_id"]
 
-combined_by_acct = dict(st.session_state.stmts_by_acct)
-_uploaded_stmts = [f for f in st.session_state.user_statements if f["account"] == "uploaded"]
-_other_docs     = [f for f in st.session_state.user_statements if f["account"] == "other_docs"]
-if _uploaded_stmts:
-    combined_by_acct["uploaded"]   = _uploaded_stmts
-# Always present so the option appears in the sourcing dropdown
-combined_by_acct["other_docs"] = _other_docs
+# Only the open loan's rows, sourcing records and uploads are read
+if st.session_state.ledger is None:
+    st.session_state.ledger         = store.load_ledger(loan_id)
+    st.session_state.sourcing       = store.load_sourcing(loan_id)
+    st.session_state.sourcing_saved = {
+        idx: json.dumps(rec, sort_keys=True) for idx, rec in st.session_state.sourcing.items()
+    }
+    if not st.session_state.ledger.empty:
+        st.session_state.open_item = int(st.session_state.ledger.index[0])
+
+library = load_local_files(loan_doc_root(loan_id))
+library.refresh()
+if st.session_state.docs is None:
+    st.session_state.docs = DocRegistry()
+    for _fd in store.load_uploads(loan_id):
+        st.session_state.docs.add_upload(_fd)
+# Library documents plus this session's uploads, indexed by name and hash
+docs_reg = st.session_state.docs
+docs_reg.sync(library)
+
+def add_upload(upload, account) -> bool:
+    """Write an uploaded file to the blob store and register a reference to it."""
+    digest, size = BLOBS.put(upload)
+    fd = BLOBS.doc(digest, size, upload.name, upload.type, account)
+    if not docs_reg.add_upload(fd):
+        return False
+    store.save_upload(loan_id, fd)
+    return True
 
 # ── SOURCING HELPERS ──────────────────────────────────────────────────────────
+def sourcing_defaults() -> dict:
+    return {
+        "invoice_file_name": None,
+        "invoice_notes":     "",
+        "statements":        [],
+        "statement_notes":   [],   # list of notes, one per statement
+        # Review statuses live here, not only in widget state, because
+        # collapsed items' widgets are not built and lose their state
+        "invoice_status":    STATUS_OPTIONS[0],
+        "statement_status":  [],   # one per statement
+        "requests":          [],
+    }
+
 def get_sourcing(idx: int) -> dict:
-    if idx not in st.session_state.sourcing:
-        st.session_state.sourcing[idx] = {
-            "invoice_file_name": None,
-            "invoice_notes":     "",
-            "statements":        [],
-            "statement_notes":   [],   # list of notes, one per statement
-            "requests":          [],
-        }
-    # Back-fill keys for older session state entries
-    s = st.session_state.sourcing[idx]
-    s.setdefault("invoice_notes", "")
-    s.setdefault("statement_notes", [])
+    # Keyed by row ID (the ledger's index), which never changes for a row
+    s = st.session_state.sourcing.setdefault(idx, {})
+    # Back-fill keys for older records, and for partial ones written by
+    # scripts such as export_packages or benchmark
+    for k, v in sourcing_defaults().items():
+        s.setdefault(k, v)
     return s
 
+def save_sourcing(idx: int):
+    """Write a sourcing record to the store if it changed since the last write."""
+    rec = st.session_state.sourcing.get(idx)
+    if rec is None:
+        return
+    blob = json.dumps(rec, sort_keys=True)
+    if st.session_state.sourcing_saved.get(idx) != blob:
+        store.save_sourcing(loan_id, idx, rec)
+        st.session_state.sourcing_saved[idx] = blob
+
+# Edits made just before an st.rerun() are flushed on the next run
+save_sourcing(st.session_state.open_item)
+
 def acct_label(acct: str) -> str:
     if acct == "uploaded":
         return "Uploaded Files"
     if acct == "other_docs":
         return "Other Documents"
-    files = combined_by_acct.get(acct, [])
+    files = docs_reg.by_account.get(acct, [])
     bank  = bank_name_from_file(files[0]["name"]) if files else ""
     num   = acct_num_from_folder(acct)
     return f"{bank}  ({num})"
 
-if not st.session_state.initial_state_set and all_invoices:
-    _s = get_sourcing(0)
-    _first = all_invoices[0]["name"]
-    _s["invoice_file_name"]       = _first
-    st.session_state["inv_sel_0"] = _first
+if not st.session_state.initial_state_set and docs_reg.invoices and not st.session_state.ledger.empty:
+    # Only for a loan with nothing saved yet for its first row
+    _row = int(st.session_state.ledger.index[0])
+    if _row not in st.session_state.sourcing:
+        _s = get_sourcing(_row)
+        _first = docs_reg.invoices[0]["name"]
+        _s["invoice_file_name"] = _first
+        st.session_state[f"inv_sel_{_row}"] = _first
     st.session_state.initial_state_set = True
 
 # ── COMPUTED TOTALS ───────────────────────────────────────────────────────────
+def touch_ledger():
+    # Call after every change to st.session_state.ledger
+    st.session_state.ledger_version += 1
+
+def ledger_rollup() -> dict:
+    """Totals and UOP roll-up, recomputed only when the ledger version changes."""
+    version = st.session_state.ledger_version
+    memo    = st.session_state.rollup
+    if memo is None or memo[0] != version:
+        memo = (version, compute_rollup(st.session_state.ledger, UOP_ITEMS, loan["equity_required"]))
+        st.session_state.rollup = memo
+    return memo[1]
+
 def compute_totals():
-    df = st.session_state.ledger
-    if df.empty:
-        return 0.0, 0.0, 0.0, EQUITY_REQUIRED
-    total     = df["Amount"].sum()
-    sourced   = df.loc[df["Sourced"],  "Amount"].sum()
-    unsourced = df.loc[~df["Sourced"], "Amount"].sum()
-    return total, sourced, unsourced, EQUITY_REQUIRED - sourced
+    r = ledger_rollup()
+    return r["total"], r["sourced"], r["unsourced"], r["remaining"]
+
+# ── EXPORT JOBS ───────────────────────────────────────────────────────────────
+def start_export(kind: str, watermark: bool, profile: str):
+    """Snapshot the package inputs and build the PDF on a background thread."""
+    cancel_export(kind)
+    st.session_state.pop(f"{kind}_pdf", None)
+    st.session_state.export_jobs[kind] = submit_export(
+        kind, build_package_pdf,
+        watermark=watermark, profile=profile, inputs=export_inputs(),
+    )
+
+def cancel_export(kind: str):
+    job = st.session_state.export_jobs.pop(kind, None)
+    if job is not None:
+        job.cancel()
+
+@st.fragment(run_every=1.0)
+def export_progress(kind: str):
+    # Polls only this fragment while the job runs; a full rerun on completion
+    # lets export_panel pick up the finished bytes.
+    job = st.session_state.export_jobs.get(kind)
+    if job is None or job.finished is not None:
+        st.rerun()
+    st.progress(job.fraction, text=f"Building {kind} PDF... page {job.done} of {job.total or '?'}")
+    if st.button("Cancel", key=f"cancel_{kind}"):
+        cancel_export(kind)
+        st.rerun()
+
+def export_panel(kind: str, file_name: str):
+    job = st.session_state.export_jobs.get(kind)
+    if job is not None and job.finished is not None:
+        st.session_state.export_jobs.pop(kind)
+        if job.error is not None:
+            st.error(f"Error generating {kind} PDF: {job.error}")
+        elif job.result is not None:
+            st.session_state[f"{kind}_pdf"] = job.result
+        job = None
+
+    if job is not None:
+        export_progress(kind)
+    elif st.session_state.get(f"{kind}_pdf"):
+        pdf = st.session_state[f"{kind}_pdf"]
+        st.download_button(
+            label=f"Download {kind.title()} PDF",
+            data=pdf,
+            file_name=file_name,
+            mime="application/pdf",
+        )
+        st.caption(f"{len(pdf) / (1024 * 1024):,.1f} MB" if len(pdf) >= 1024 * 1024
+                   else f"{len(pdf) / 1024:,.0f} KB")
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE TITLE
 # ══════════════════════════════════════════════════════════════════════════════
 st.markdown("# Closing Equity Injection")
+
+def new_loan_id(name: str) -> str:
+    base = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "loan"
+    cand, n = base, 1
+    while store.get_loan(cand) is not None:
+        n += 1
+        cand = f"{base}-{n}"
+    return cand
+
+sel_col, new_col = st.columns([4, 1])
+# The form runs before the selector is built, so it may still reset loan_sel
+with new_col:
+    with st.popover("+ New Loan", use_container_width=True):
+        with st.form("new_loan_form", clear_on_submit=True):
+            nl_name   = st.text_input("Loan Name*")
+            nl_amount = st.number_input("Loan Amount ($)", min_value=0.0, value=0.0, format="%.2f")
+            nl_equity = st.number_input("Equity Injection Required ($)", min_value=0.0,
+                                        value=0.0, format="%.2f")
+            if st.form_submit_button("Create Loan", type="primary"):
+                if not nl_name.strip():
+                    st.error("Loan Name is required.")
+                else:
+                    _new_id = new_loan_id(nl_name)
+                    store.ensure_loan(_new_id, nl_name.strip(), nl_amount, nl_equity)
+                    activate_loan(_new_id)
+                    st.session_state.pop("loan_sel", None)
+                    st.rerun()
+
+loan_names = {l["loan_id"]: l["name"] for l in loans}
+sel_col.selectbox(
+    "Loan", list(loan_names), index=list(loan_names).index(loan_id),
+    key="loan_sel", format_func=loan_names.get, on_change=switch_loan,
+    label_visibility="collapsed",
+)
 st.markdown("---")
 
 tab1, tab2, tab3 = st.tabs(["Equity Injection", "Statements", "Other Documents"])
@@ -648,17 +582,17 @@ with tab1:
 
     c1.markdown(f"""<div>
         <div class="loan-label">Loan Name</div>
-        <div class="loan-value">{LOAN_NAME}</div>
+        <div class="loan-value">{loan["name"]}</div>
     </div>""", unsafe_allow_html=True)
 
     c2.markdown(f"""<div>
         <div class="loan-label">Loan Amount</div>
-        <div class="loan-value">${LOAN_AMOUNT:,.0f}</div>
+        <div class="loan-value">${loan["loan_amount"]:,.0f}</div>
     </div>""", unsafe_allow_html=True)
 
     c3.markdown(f"""<div>
         <div class="loan-label">Equity Injection Required</div>
-        <div class="loan-value">${EQUITY_REQUIRED:,.0f}</div>
+        <div class="loan-value">${loan["equity_required"]:,.0f}</div>
     </div>""", unsafe_allow_html=True)
 
     c4.markdown(f"""<div>
@@ -685,40 +619,32 @@ with tab1:
 
     with col_inv:
         st.markdown("**Invoices / Receipts**")
+        # Uploader keys carry the loan, so a pending file never lands in another loan
         up_inv = st.file_uploader(
             "invoices", type=["pdf", "png", "jpg", "jpeg"],
-            accept_multiple_files=True, key="inv_uploader",
+            accept_multiple_files=True, key=f"inv_uploader_{loan_id}",
             label_visibility="collapsed"
         )
         if up_inv:
-            existing = {f["name"] for f in st.session_state.user_invoices}
             for f in up_inv:
-                if f.name not in existing:
-                    st.session_state.user_invoices.append(
-                        {"name": f.name, "data": f.read(), "type": f.type, "account": None}
-                    )
-        if all_invoices:
-            st.caption(f"{len(all_invoices)} invoice(s) available")
+                if docs_reg.invoice(f.name) is None:
+                    add_upload(f, None)
+        if docs_reg.invoices:
+            st.caption(f"{len(docs_reg.invoices)} invoice(s) available")
 
     with col_stmt:
         st.markdown("**Bank / Credit Card Statements**")
         up_stmt = st.file_uploader(
             "statements", type=["pdf", "png", "jpg", "jpeg"],
-            accept_multiple_files=True, key="stmt_uploader",
+            accept_multiple_files=True, key=f"stmt_uploader_{loan_id}",
             label_visibility="collapsed"
         )
         if up_stmt:
-            existing = {f["name"] for f in st.session_state.user_statements}
             for f in up_stmt:
-                if f.name not in existing:
-                    st.session_state.user_statements.append(
-                        {"name": f.name, "data": f.read(), "type": f.type, "account": "uploaded"}
-                    )
-            combined_by_acct["uploaded"] = [
-                f for f in st.session_state.user_statements if f["account"] == "uploaded"
-            ]
-        if all_statements:
-            st.caption(f"{len(all_statements)} statement(s) available")
+                if docs_reg.statement(f.name) is None:
+                    add_upload(f, "uploaded")
+        if docs_reg.statements:
+            st.caption(f"{len(docs_reg.statements)} statement(s) available")
 
     st.markdown("---")
 
@@ -735,11 +661,18 @@ with tab1:
     for col, lbl in zip(hcols, HEADS):
         col.markdown(f'<div class="ledger-header">{lbl}</div>', unsafe_allow_html=True)
 
+    n_pages = max(1, -(-len(ledger) // LEDGER_PAGE_SIZE))
+    page    = min(st.session_state.ledger_page, n_pages - 1)
+    st.session_state.ledger_page = page
+    first   = page * LEDGER_PAGE_SIZE
+
     to_del = []
     if ledger.empty:
         st.markdown("*No entries yet.*")
     else:
-        for row_num, (idx, row) in enumerate(ledger.iterrows(), 1):
+        # Only the visible page is drawn, so rerun cost does not grow with the ledger
+        page_rows = ledger.iloc[first: first + LEDGER_PAGE_SIZE]
+        for row_num, (idx, row) in enumerate(page_rows.iterrows(), first + 1):
             rc = st.columns(CW)
             rc[0].markdown(f'<div class="ledger-row" style="color:#6c757d">{row_num}</div>', unsafe_allow_html=True)
             rc[1].markdown(f'<div class="ledger-row">{row["Funds Used For"]}</div>', unsafe_allow_html=True)
@@ -759,17 +692,42 @@ with tab1:
                 "uop", uop_opts, index=uop_default,
                 key=f"uop_{idx}", label_visibility="collapsed"
             )
-            if new_uop != "- Select -":
+            if new_uop == "- Select -":
+                new_uop = cur_uop if cur_uop in UOP_ITEMS else ""
+            if new_uop != cur_uop:
                 st.session_state.ledger.at[idx, "UOP Item"] = new_uop
-            elif "UOP Item" not in st.session_state.ledger.columns or st.session_state.ledger.at[idx, "UOP Item"] not in UOP_ITEMS:
-                st.session_state.ledger.at[idx, "UOP Item"] = ""
+                store.update_row(loan_id, idx, **{"UOP Item": new_uop})
+                touch_ledger()
             if rc[9].button("x", key=f"del_{idx}", help="Delete entry"):
                 to_del.append(idx)
 
     if to_del:
-        st.session_state.ledger = ledger.drop(to_del).reset_index(drop=True)
+        # Row IDs are stable: only the deleted rows and their sourcing go away
+        st.session_state.ledger = ledger.drop(to_del)
+        for _row in to_del:
+            st.session_state.sourcing.pop(_row, None)
+            st.session_state.sourcing_saved.pop(_row, None)
+            st.session_state.pop(f"show_req_{_row}", None)
+        store.delete_rows(loan_id, to_del)
+        touch_ledger()
         st.rerun()
 
+    if n_pages > 1:
+        pc1, pc2, pc3 = st.columns([1, 4, 1])
+        if pc1.button("< Prev", key="ledger_prev", disabled=page == 0, use_container_width=True):
+            st.session_state.ledger_page = page - 1
+            st.rerun()
+        pc2.markdown(
+            f"<div style='text-align:center;color:#6c757d;font-size:0.85rem;padding-top:6px'>"
+            f"Rows {first + 1}-{min(first + LEDGER_PAGE_SIZE, len(ledger))} of {len(ledger)}"
+            f"  (page {page + 1} of {n_pages})</div>",
+            unsafe_allow_html=True
+        )
+        if pc3.button("Next >", key="ledger_next", disabled=page >= n_pages - 1,
+                      use_container_width=True):
+            st.session_state.ledger_page = page + 1
+            st.rerun()
+
     st.markdown("<br>", unsafe_allow_html=True)
     tc = st.columns(CW)
     tc[3].markdown('<div class="total-row">Total Amount</div>', unsafe_allow_html=True)
@@ -778,7 +736,7 @@ with tab1:
     sc2[3].markdown('<div class="total-row">Total Sourced</div>', unsafe_allow_html=True)
     sc2[4].markdown(f'<div class="total-row" style="color:#198754">${sourced_amount:,.2f}</div>',
                     unsafe_allow_html=True)
-    ei_closing = max(0.0, EQUITY_REQUIRED - sourced_amount)
+    ei_closing = max(0.0, loan["equity_required"] - sourced_amount)
     ei_closing_color = "#dc3545" if ei_closing > 0 else "#198754"
     ec = st.columns(CW)
     ec[3].markdown('<div class="total-row">Additional EI Required to Close</div>', unsafe_allow_html=True)
@@ -805,14 +763,20 @@ with tab1:
                 if not nf or not nv:
                     st.error("Funds Used For and Vendor Name are required.")
                 else:
-                    st.session_state.ledger = pd.concat([
-                        st.session_state.ledger,
-                        pd.DataFrame([{"Funds Used For": nf, "Date": str(nd),
-                                       "Vendor Name": nv, "Amount": na,
-                                       "Bank Account#": nb, "Invoice#": ni, "Sourced": ns,
-                                       "UOP Item": nu if nu != "- Select -" else ""}])
-                    ], ignore_index=True)
+                    new_row = {"Funds Used For": nf, "Date": str(nd),
+                               "Vendor Name": nv, "Amount": na,
+                               "Bank Account#": nb, "Invoice#": ni, "Sourced": ns,
+                               "UOP Item": nu if nu != "- Select -" else ""}
+                    # The store hands out the ID, so two closers adding rows
+                    # to the same loan cannot collide
+                    new_id  = store.insert_row(loan_id, new_row)
+                    st.session_state.ledger = pd.concat(
+                        [st.session_state.ledger, pd.DataFrame([new_row], index=[new_id])]
+                    )
+                    touch_ledger()
                     st.session_state.show_add_form = False
+                    # Jump to the page showing the new entry
+                    st.session_state.ledger_page = (len(st.session_state.ledger) - 1) // LEDGER_PAGE_SIZE
                     st.rerun()
 
     st.markdown("---")
@@ -820,83 +784,79 @@ with tab1:
     # ── UOP ROLL-UP ───────────────────────────────────────────────────────────
     st.markdown("### Use of Proceeds Roll-up")
 
-    df_uop = st.session_state.ledger
-    if df_uop.empty or "UOP Item" not in df_uop.columns:
+    rollup_rows = [
+        {"UOP Item": item, "Total Sourced": ts, "EI Outstanding": ei_out,
+         "Total EI Available": ta, "Fully Sourced": fs}
+        for item, ts, ei_out, ta, fs in ledger_rollup()["uop"]
+    ]
+    if not rollup_rows:
         st.markdown("*Assign UOP Items in the ledger above to see the roll-up.*")
     else:
-        assigned = df_uop[df_uop["UOP Item"].isin(UOP_ITEMS)]
-        if assigned.empty:
-            st.markdown("*Assign UOP Items in the ledger above to see the roll-up.*")
-        else:
-            # Build roll-up grouped by UOP Item (preserve order of UOP_ITEMS)
-            rollup_rows = []
-            for uop_item in UOP_ITEMS:
-                grp = assigned[assigned["UOP Item"] == uop_item]
-                if grp.empty:
-                    continue
-                total_sourced = grp.loc[grp["Sourced"], "Amount"].sum()
-                total_amount  = grp["Amount"].sum()
-                ei_outstanding = total_amount - total_sourced
-                total_ei_avail = EQUITY_REQUIRED  # same pool for all items
-                fully_sourced  = "Yes" if ei_outstanding <= 0 else "No"
-                rollup_rows.append({
-                    "UOP Item":           uop_item,
-                    "Total Sourced":      total_sourced,
-                    "EI Outstanding":     ei_outstanding,
-                    "Total EI Available": total_amount,
-                    "Fully Sourced":      fully_sourced,
-                })
-
-            RCW   = [0.3, 2.0, 1.5, 1.5, 1.8, 1.2]
-            RHEADS = ["#", "UOP Item", "Total Sourced", "EI Outstanding",
-                      "Total EI Available", "Fully Sourced"]
-            rhcols = st.columns(RCW)
-            for col, lbl in zip(rhcols, RHEADS):
-                col.markdown(f'<div class="ledger-header">{lbl}</div>', unsafe_allow_html=True)
-
-            for r_num, rrow in enumerate(rollup_rows, 1):
-                rrc = st.columns(RCW)
-                rrc[0].markdown(f'<div class="ledger-row" style="color:#6c757d">{r_num}</div>', unsafe_allow_html=True)
-                rrc[1].markdown(f'<div class="ledger-row">{rrow["UOP Item"]}</div>', unsafe_allow_html=True)
-                rrc[2].markdown(f'<div class="ledger-row" style="color:#198754">${rrow["Total Sourced"]:,.2f}</div>', unsafe_allow_html=True)
-                ei_color = "#dc3545" if rrow["EI Outstanding"] > 0 else "#198754"
-                rrc[3].markdown(f'<div class="ledger-row" style="color:{ei_color}">${rrow["EI Outstanding"]:,.2f}</div>', unsafe_allow_html=True)
-                rrc[4].markdown(f'<div class="ledger-row">${rrow["Total EI Available"]:,.2f}</div>', unsafe_allow_html=True)
-                fs_c = "sourced-yes" if rrow["Fully Sourced"] == "Yes" else "sourced-no"
-                rrc[5].markdown(f'<div class="ledger-row {fs_c}">{rrow["Fully Sourced"]}</div>', unsafe_allow_html=True)
-
-            # Totals row
-            st.markdown("<br>", unsafe_allow_html=True)
-            rtc = st.columns(RCW)
-            rtc[1].markdown('<div class="total-row">Totals</div>', unsafe_allow_html=True)
-            rtc[2].markdown(f'<div class="total-row" style="color:#198754">${sum(r["Total Sourced"] for r in rollup_rows):,.2f}</div>', unsafe_allow_html=True)
-            ei_tot = sum(r["EI Outstanding"] for r in rollup_rows)
-            ei_tot_color = "#dc3545" if ei_tot > 0 else "#198754"
-            rtc[3].markdown(f'<div class="total-row" style="color:{ei_tot_color}">${ei_tot:,.2f}</div>', unsafe_allow_html=True)
-            rtc[4].markdown(f'<div class="total-row">${sum(r["Total EI Available"] for r in rollup_rows):,.2f}</div>', unsafe_allow_html=True)
-            uop_sourced_total = sum(r["Total Sourced"] for r in rollup_rows)
-            uop_ei_closing = max(0.0, EQUITY_REQUIRED - uop_sourced_total)
-            uop_ei_closing_color = "#dc3545" if uop_ei_closing > 0 else "#198754"
-            rec = st.columns(RCW)
-            rec[1].markdown('<div class="total-row">Additional EI Required to Close</div>', unsafe_allow_html=True)
-            rec[2].markdown(f'<div class="total-row" style="color:{uop_ei_closing_color}">${uop_ei_closing:,.2f}</div>', unsafe_allow_html=True)
+        RCW   = [0.3, 2.0, 1.5, 1.5, 1.8, 1.2]
+        RHEADS = ["#", "UOP Item", "Total Sourced", "EI Outstanding",
+                  "Total EI Available", "Fully Sourced"]
+        rhcols = st.columns(RCW)
+        for col, lbl in zip(rhcols, RHEADS):
+            col.markdown(f'<div class="ledger-header">{lbl}</div>', unsafe_allow_html=True)
+
+        for r_num, rrow in enumerate(rollup_rows, 1):
+            rrc = st.columns(RCW)
+            rrc[0].markdown(f'<div class="ledger-row" style="color:#6c757d">{r_num}</div>', unsafe_allow_html=True)
+            rrc[1].markdown(f'<div class="ledger-row">{rrow["UOP Item"]}</div>', unsafe_allow_html=True)
+            rrc[2].markdown(f'<div class="ledger-row" style="color:#198754">${rrow["Total Sourced"]:,.2f}</div>', unsafe_allow_html=True)
+            ei_color = "#dc3545" if rrow["EI Outstanding"] > 0 else "#198754"
+            rrc[3].markdown(f'<div class="ledger-row" style="color:{ei_color}">${rrow["EI Outstanding"]:,.2f}</div>', unsafe_allow_html=True)
+            rrc[4].markdown(f'<div class="ledger-row">${rrow["Total EI Available"]:,.2f}</div>', unsafe_allow_html=True)
+            fs_c = "sourced-yes" if rrow["Fully Sourced"] == "Yes" else "sourced-no"
+            rrc[5].markdown(f'<div class="ledger-row {fs_c}">{rrow["Fully Sourced"]}</div>', unsafe_allow_html=True)
+
+        # Totals row
+        st.markdown("<br>", unsafe_allow_html=True)
+        rtc = st.columns(RCW)
+        rtc[1].markdown('<div class="total-row">Totals</div>', unsafe_allow_html=True)
+        rtc[2].markdown(f'<div class="total-row" style="color:#198754">${sum(r["Total Sourced"] for r in rollup_rows):,.2f}</div>', unsafe_allow_html=True)
+        ei_tot = sum(r["EI Outstanding"] for r in rollup_rows)
+        ei_tot_color = "#dc3545" if ei_tot > 0 else "#198754"
+        rtc[3].markdown(f'<div class="total-row" style="color:{ei_tot_color}">${ei_tot:,.2f}</div>', unsafe_allow_html=True)
+        rtc[4].markdown(f'<div class="total-row">${sum(r["Total EI Available"] for r in rollup_rows):,.2f}</div>', unsafe_allow_html=True)
+        uop_sourced_total = sum(r["Total Sourced"] for r in rollup_rows)
+        uop_ei_closing = max(0.0, loan["equity_required"] - uop_sourced_total)
+        uop_ei_closing_color = "#dc3545" if uop_ei_closing > 0 else "#198754"
+        rec = st.columns(RCW)
+        rec[1].markdown('<div class="total-row">Additional EI Required to Close</div>', unsafe_allow_html=True)
+        rec[2].markdown(f'<div class="total-row" style="color:{uop_ei_closing_color}">${uop_ei_closing:,.2f}</div>', unsafe_allow_html=True)
 
     st.markdown("---")
 
     # ── DOCUMENT SOURCING ─────────────────────────────────────────────────────
     st.markdown("### Document Sourcing")
 
-    inv_names = [f["name"] for f in all_invoices]
+    inv_names = [f["name"] for f in docs_reg.invoices]
 
     if st.session_state.ledger.empty:
         st.markdown("*No ledger entries to source.*")
     else:
+        switch_to = None
         for row_num, (idx, row) in enumerate(st.session_state.ledger.iterrows(), 1):
             sourcing = get_sourcing(idx)
             # Number prefix in the expander label
             label    = f"{row_num}. {row['Vendor Name']}  -  {row['Funds Used For']}  |  ${float(row['Amount']):,.2f}"
 
-            with st.expander(label, expanded=(idx == 0)):
+            # Only the open item builds its widgets; the rest are one button each
+            if idx != st.session_state.open_item:
+                n_docs = len(sourcing["statements"]) + bool(sourcing["invoice_file_name"])
+                n_reqs = len(sourcing["requests"])
+                status = ":green[**Sourced**]" if row["Sourced"] else ":red[Unsourced]"
+                header = f"{label}  ·  {status}  ·  {n_docs} document(s)"
+                if n_reqs:
+                    header += f"  ·  :orange[**{n_reqs} request(s)**]"
+                if st.button(header, key=f"open_item_{idx}", use_container_width=True):
+                    # Switched after the loop, once the open item's widgets
+                    # have copied their values into its record
+                    switch_to = idx
+                continue
+
+            with st.expander(label, expanded=True):
 
                 # Inject hidden marker so CSS :has() can make this expander green
                 if row["Sourced"]:
@@ -919,28 +879,31 @@ with tab1:
                 with doc_cols[0]:
                     st.markdown(col_label("Invoice / Receipt"), unsafe_allow_html=True)
                     inv_opts = ["- Select invoice -"] + inv_names
+                    # Widget state is dropped while the item is collapsed
+                    if f"inv_sel_{idx}" not in st.session_state and sourcing["invoice_file_name"] in inv_names:
+                        st.session_state[f"inv_sel_{idx}"] = sourcing["invoice_file_name"]
                     sel_inv  = st.selectbox(
                         "inv", inv_opts, key=f"inv_sel_{idx}",
                         label_visibility="collapsed"
                     )
                     if sel_inv != "- Select invoice -":
                         sourcing["invoice_file_name"] = sel_inv
-                        inv_f = find_file(all_invoices, sel_inv)
+                        inv_f = docs_reg.invoice(sel_inv)
                         st.markdown(
-                            doc_card_html(sel_inv, inv_f["data"] if inv_f else None),
+                            doc_card_html(sel_inv, inv_f),
                             unsafe_allow_html=True
                         )
                         if inv_f:
-                            with st.expander("View", expanded=False):
-                                st.image(inv_f["data"], use_container_width=True)
+                            doc_viewer(inv_f, f"inv_{idx}")
                     else:
                         sourcing["invoice_file_name"] = None
                         st.markdown(
                             '<div class="doc-card-empty">No invoice<br>assigned</div>',
                             unsafe_allow_html=True
                         )
-                    st.selectbox(
+                    sourcing["invoice_status"] = st.selectbox(
                         "inv_status", STATUS_OPTIONS,
+                        index=STATUS_OPTIONS.index(sourcing["invoice_status"]),
                         key=f"inv_status_{idx}", label_visibility="collapsed"
                     )
                     # Closer notes text box for invoice
@@ -958,22 +921,24 @@ with tab1:
                 # Ensure statement_notes list is long enough
                 while len(sourcing["statement_notes"]) < len(sourcing["statements"]):
                     sourcing["statement_notes"].append("")
+                while len(sourcing["statement_status"]) < len(sourcing["statements"]):
+                    sourcing["statement_status"].append(STATUS_OPTIONS[0])
 
                 for j, sname in enumerate(sourcing["statements"]):
                     if j + 1 >= MAX_DOC_COLS:
                         break
                     with doc_cols[j + 1]:
                         st.markdown(col_label(f"Statement {j + 1}"), unsafe_allow_html=True)
-                        sf = find_file(all_statements, sname)
+                        sf = docs_reg.statement(sname)
                         st.markdown(
-                            doc_card_html(sname, sf["data"] if sf else None),
+                            doc_card_html(sname, sf),
                             unsafe_allow_html=True
                         )
                         if sf:
-                            with st.expander("View", expanded=False):
-                                st.image(sf["data"], use_container_width=True)
-                        st.selectbox(
+                            doc_viewer(sf, f"stmt_{idx}_{j}")
+                        sourcing["statement_status"][j] = st.selectbox(
                             f"stmt_status_{j}", STATUS_OPTIONS,
+                            index=STATUS_OPTIONS.index(sourcing["statement_status"][j]),
                             key=f"stmt_status_{idx}_{j}", label_visibility="collapsed"
                         )
                         # Closer notes text box for this statement
@@ -998,6 +963,10 @@ with tab1:
                         n for i, n in enumerate(sourcing["statement_notes"])
                         if i not in stmts_to_remove
                     ]
+                    sourcing["statement_status"] = [
+                        t for i, t in enumerate(sourcing["statement_status"])
+                        if i not in stmts_to_remove
+                    ]
                     st.rerun()
 
                 # Add Statement card - next available col
@@ -1007,7 +976,7 @@ with tab1:
                         st.markdown(col_label("Add Statement"), unsafe_allow_html=True)
                         avail_accts = {
                             acct: [f for f in files if f["name"] not in sourcing["statements"]]
-                            for acct, files in combined_by_acct.items()
+                            for acct, files in docs_reg.by_account.items()
                         }
                         # Keep non-empty accounts + always keep other_docs
                         avail_accts = {
@@ -1018,23 +987,13 @@ with tab1:
                         # Upload zone - styled via CSS to look like doc-card-add
                         up_new_stmt = st.file_uploader(
                             "upload_stmt", type=["pdf", "png", "jpg", "jpeg"],
-                            key=f"stmt_upload_{idx}", label_visibility="collapsed"
+                            key=f"stmt_upload_{loan_id}_{idx}", label_visibility="collapsed"
                         )
-                        if up_new_stmt is not None:
-                            existing_names = {
-                                f["name"] for f in st.session_state.user_statements
-                            }
-                            if up_new_stmt.name not in existing_names:
-                                new_fd = {
-                                    "name":    up_new_stmt.name,
-                                    "data":    up_new_stmt.read(),
-                                    "type":    up_new_stmt.type,
-                                    "account": "other_docs",
-                                }
-                                st.session_state.user_statements.append(new_fd)
-                                sourcing["statements"].append(up_new_stmt.name)
-                                sourcing["statement_notes"].append("")
-                                st.rerun()
+                        if up_new_stmt is not None and docs_reg.statement(up_new_stmt.name) is None:
+                            add_upload(up_new_stmt, "other_docs")
+                            sourcing["statements"].append(up_new_stmt.name)
+                            sourcing["statement_notes"].append("")
+                            st.rerun()
 
                         # Select from existing loaded statements / other docs
                         if avail_accts:
@@ -1082,6 +1041,8 @@ with tab1:
                     new_sourced = (sourced_choice == "Sourced")
                     if new_sourced != bool(row["Sourced"]):
                         st.session_state.ledger.at[idx, "Sourced"] = new_sourced
+                        store.update_row(loan_id, idx, Sourced=new_sourced)
+                        touch_ledger()
                         st.rerun()
 
                     # Request Missing Document
@@ -1118,6 +1079,11 @@ with tab1:
                         sourcing["requests"].pop(req_to_remove)
                         st.rerun()
 
+        save_sourcing(st.session_state.open_item)
+        if switch_to is not None:
+            st.session_state.open_item = switch_to
+            st.rerun()
+
     st.markdown("---")
 
     # ── PENDING REQUESTS ──────────────────────────────────────────────────────
@@ -1144,6 +1110,14 @@ with tab1:
     # ── EXPORT PACKAGE ────────────────────────────────────────────────────────
     st.markdown("### Export Package")
 
+    profile = st.selectbox(
+        "Export profile", list(EXPORT_PROFILES),
+        index=list(EXPORT_PROFILES).index(DEFAULT_PROFILE), key="export_profile",
+        format_func=lambda p: EXPORT_PROFILES[p]["label"],
+        help="Trades fidelity for file size; lender portals often cap uploads.",
+    )
+    st.caption(EXPORT_PROFILES[profile]["description"])
+
     df_check    = st.session_state.ledger
     all_sourced = (not df_check.empty) and bool(df_check["Sourced"].all())
 
@@ -1154,22 +1128,13 @@ with tab1:
     draft_col, approval_col = st.columns([3, 2])
 
     with draft_col:
-        if st.button("Generate Draft PDF", type="secondary"):
-            with st.spinner("Building draft PDF..."):
-                try:
-                    st.session_state["draft_pdf"] = build_package_pdf(watermark=True)
-                except Exception as e:
-                    st.error(f"Error generating draft PDF: {e}")
-                    st.session_state.pop("draft_pdf", None)
-
-        if st.session_state.get("draft_pdf"):
-            fname_draft = f"DRAFT_closing_package_{LOAN_NAME.replace(' ', '_')}.pdf"
-            st.download_button(
-                label="Download Draft PDF",
-                data=st.session_state["draft_pdf"],
-                file_name=fname_draft,
-                mime="application/pdf",
-            )
+        # A running build disables the button so a stray click cannot restart it
+        if st.button("Generate Draft PDF", type="secondary",
+                     disabled="draft" in st.session_state.export_jobs):
+            start_export("draft", watermark=True, profile=profile)
+
+        fname_draft = f"DRAFT_closing_package_{loan['name'].replace(' ', '_')}.pdf"
+        export_panel("draft", fname_draft)
 
     with approval_col:
         is_approved = st.checkbox(
@@ -1180,6 +1145,7 @@ with tab1:
         if is_approved != st.session_state.get("package_approved", False):
             st.session_state["package_approved"] = is_approved
             st.session_state.pop("final_pdf", None)
+            cancel_export("final")
             st.rerun()
         if is_approved:
             st.caption("Package approved - final PDF unlocked.")
@@ -1197,22 +1163,12 @@ with tab1:
         st.warning("All ledger items must be marked **Sourced** before the final package can be generated.")
     else:
         st.success("All items sourced and package approved - final PDF available.")
-        if st.button("Generate Final PDF", type="primary"):
-            with st.spinner("Building final PDF..."):
-                try:
-                    st.session_state["final_pdf"] = build_package_pdf(watermark=False)
-                except Exception as e:
-                    st.error(f"Error generating final PDF: {e}")
-                    st.session_state.pop("final_pdf", None)
-
-        if st.session_state.get("final_pdf"):
-            fname_final = f"FINAL_closing_package_{LOAN_NAME.replace(' ', '_')}.pdf"
-            st.download_button(
-                label="Download Final PDF",
-                data=st.session_state["final_pdf"],
-                file_name=fname_final,
-                mime="application/pdf",
-            )
+        if st.button("Generate Final PDF", type="primary",
+                     disabled="final" in st.session_state.export_jobs):
+            start_export("final", watermark=False, profile=profile)
+
+        fname_final = f"FINAL_closing_package_{loan['name'].replace(' ', '_')}.pdf"
+        export_panel("final", fname_final)
 
 # ══════════════════════════════════════════════════════════════════════════════
 # TAB 2 - STATEMENTS
@@ -1220,7 +1176,7 @@ with tab1:
 with tab2:
     st.markdown("### Bank / Credit Card Statements")
 
-    stmt_accts = {k: v for k, v in combined_by_acct.items() if k != "other_docs"}
+    stmt_accts = {k: v for k, v in docs_reg.by_account.items() if k != "other_docs"}
 
     if not stmt_accts:
         st.info("No statements loaded. Run generate_examples.py to create demo documents.")
@@ -1239,7 +1195,7 @@ with tab2:
                     for col, fd in zip(cols, row_files):
                         with col:
                             month_label = parse_month(fd["name"])
-                            thumb       = get_thumbnail(fd["name"], fd["data"])
+                            thumb       = get_thumbnail(fd)
                             if thumb:
                                 card_html = (
                                     f'<div class="doc-card">'
@@ -1258,8 +1214,7 @@ with tab2:
                                     f'</div>'
                                 )
                             st.markdown(card_html, unsafe_allow_html=True)
-                            with st.expander("View", expanded=False):
-                                st.image(fd["data"], use_container_width=True)
+                            doc_viewer(fd, f"acct_{acct_folder}_{fd['name']}")
 
 # ══════════════════════════════════════════════════════════════════════════════
 # TAB 3 - OTHER DOCUMENTS
@@ -1267,7 +1222,7 @@ with tab2:
 with tab3:
     st.markdown("### Other Documents")
 
-    other_docs = combined_by_acct.get("other_docs", [])
+    other_docs = docs_reg.by_account.get("other_docs", [])
 
     if not other_docs:
         st.info("No other documents uploaded yet. Use the upload zone in Document Sourcing to add files here.")
@@ -1278,7 +1233,7 @@ with tab3:
             cols      = st.columns(MAX_DOC_COLS)
             for col, fd in zip(cols, row_files):
                 with col:
-                    thumb = get_thumbnail(fd["name"], fd["data"])
+                    thumb = get_thumbnail(fd)
                     if thumb:
                         card_html = (
                             f'<div class="doc-card">'
@@ -1297,5 +1252,4 @@ with tab3:
                             f'</div>'
                         )
                     st.markdown(card_html, unsafe_allow_html=True)
-                    with st.expander("View", expanded=False):
-                        st.image(fd["data"], use_container_width=True)
\ No newline at end of file
+                    doc_viewer(fd, f"other_{fd['name']}")
\ No newline at end of file
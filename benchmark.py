@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Benchmarks for app startup, reruns, thumbnailing and package export.
+
+Each loan size runs in a fresh process against its own throwaway database,
+blob store and thumbnail folder, with the demo loan's ledger tiled to that
+many rows and every row sourced from the document library (``--root``,
+default this folder; a loan folder from ``generate_examples.py`` supplies its
+own ledger). Timings are in seconds; repeated measurements report the median.
+
+    python benchmark.py                                # sizes 10, 100, 500
+    python benchmark.py --sizes 50,2000 --out bench.json
+    python benchmark.py --baseline bench_baseline.json # compare, exit 1 on regression
+    python benchmark.py --save-baseline bench_baseline.json
+
+Metrics per size:
+
+    cold_start      import Streamlit's AppTest and run the app once, new process
+    warm_start      first run of a second session in the same process
+    rerun           full script rerun of an open session
+    thumbs_cold     make_thumbnail for every library document
+    thumbs_warm     the same thumbnails from a ThumbnailCache, looked up by digest
+                    as the app does
+    draft_export    watermarked package, "high-fidelity" profile
+    final_export    unwatermarked package, "high-fidelity" profile
+    raster_export   watermarked package, "archive" profile (every page re-rendered)
+    email_export    watermarked package, "email-size" profile
+    raster_rerender raster_export again, served from the page cache
+
+Each export also records its output size in ``<metric>_bytes``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+
+APP_DIR       = Path(__file__).resolve().parent
+DEFAULT_SIZES = "10,100,500"
+# Differences below this many seconds are noise, whatever the ratio
+NOISE_FLOOR_S = 0.02
+
+
+# ── CHILD: ONE LOAN SIZE ──────────────────────────────────────────────────────
+def _median_time(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def seed_loan(rows: int, root: Path):
+    """Store the demo loan with ``rows`` ledger rows, each matched to its documents.
+
+    The ledger is ``root``'s own ledger.csv if it has one, else demo_data.csv,
+    tiled or truncated to ``rows``.
+    """
+    import pandas as pd
+
+    from doc_library import DocLibrary
+    from export_packages import match_sourcing, read_ledger
+    from store import LedgerStore
+
+    # A generated loan folder (generate_examples.py) brings its own ledger
+    src  = root / "ledger.csv"
+    demo = read_ledger(src if src.exists() else APP_DIR / "demo_data.csv")
+    df   = pd.concat([demo] * (rows // len(demo) + 1), ignore_index=True).iloc[:rows]
+    invoices, _, by_account = DocLibrary(root).snapshot()
+    store = LedgerStore()
+    store.ensure_loan("moving-company-llc", "Moving Company LLC", 1_000_000.0, 100_000.0)
+    store.replace_ledger("moving-company-llc", df)
+    for idx, row in df.iterrows():
+        store.save_sourcing("moving-company-llc", idx, match_sourcing(row, invoices, by_account))
+    return store
+
+
+def run_size(rows: int, root: Path, repeat: int) -> dict:
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    import_s = time.perf_counter() - t0
+    store    = seed_loan(rows, root)
+
+    res = {"rows": rows}
+    app = str(APP_DIR / "app.py")
+    t0  = time.perf_counter()
+    at  = AppTest.from_file(app, default_timeout=600)
+    at.run()
+    res["cold_start"] = import_s + time.perf_counter() - t0
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].message}")
+
+    t0 = time.perf_counter()
+    AppTest.from_file(app, default_timeout=600).run()
+    res["warm_start"] = time.perf_counter() - t0
+    res["rerun"]      = _median_time(at.run, repeat)
+
+    from doc_library import DocLibrary, doc_bytes, doc_digest
+    from thumbnails import ThumbnailCache, make_thumbnail
+    invoices, statements, _ = DocLibrary(root).snapshot()
+    docs  = invoices + statements
+    datas = [doc_bytes(fd) for fd in docs]
+    cache = ThumbnailCache(256 * 1024 * 1024)
+    res["documents"]   = len(datas)
+    res["thumbs_cold"] = _median_time(lambda: [make_thumbnail(d) for d in datas], repeat)
+
+    # The app's lookup: a memoised content hash, bytes only read on a miss
+    def _warm():
+        return [cache.get(digest=doc_digest(fd), load=partial(doc_bytes, fd)) for fd in docs]
+    _warm()
+    res["thumbs_warm"] = _median_time(_warm, repeat)
+
+    from package_pdf import PAGE_CACHE, build_package_pdf, package_inputs
+    by_name = {fd["name"]: fd for fd in invoices + statements}
+    inputs  = package_inputs(
+        store.get_loan("moving-company-llc"), store.load_ledger("moving-company-llc"),
+        store.load_sourcing("moving-company-llc"),
+        lambda name: partial(doc_bytes, by_name[name]) if name in by_name else None,
+        lambda name: partial(doc_bytes, by_name[name]) if name in by_name else None,
+    )
+
+    def _export(name, watermark, profile):
+        PAGE_CACHE.clear()
+        pdf = build_package_pdf(inputs, watermark=watermark, profile=profile)
+        res[f"{name}_bytes"] = len(pdf)
+
+    for name, watermark, profile in (("draft_export", True, "high-fidelity"),
+                                     ("final_export", False, "high-fidelity"),
+                                     ("raster_export", True, "archive"),
+                                     ("email_export", True, "email-size")):
+        res[name] = _median_time(lambda: _export(name, watermark, profile), repeat)
+    build_package_pdf(inputs, watermark=True, profile="archive")
+    res["raster_rerender"] = _median_time(
+        lambda: build_package_pdf(inputs, watermark=True, profile="archive"), repeat)
+    return res
+
+
+# ── PARENT: SIZES, REPORT, BASELINE ───────────────────────────────────────────
+TIMINGS = ("cold_start", "warm_start", "rerun", "thumbs_cold", "thumbs_warm",
+           "draft_export", "final_export", "raster_export", "email_export", "raster_rerender")
+
+
+def measure(rows: int, root: Path, repeat: int) -> dict:
+    """Run one loan size in a fresh process with its own database and blob store."""
+    with tempfile.TemporaryDirectory(prefix="equity-bench-") as tmp:
+        env = dict(os.environ,
+                   EQUITY_DB_PATH=str(Path(tmp) / "equity.db"),
+                   EQUITY_BLOB_DIR=str(Path(tmp) / "blobs"),
+                   EQUITY_THUMB_DIR=str(Path(tmp) / "thumbs"))
+        out = Path(tmp) / "result.json"
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", str(rows), "--root", str(root),
+             "--repeat", str(repeat), "--out", str(out)],
+            cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"{rows} rows failed:\n{proc.stderr[-2000:]}")
+        return json.loads(out.read_text())
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Print current vs baseline timings; return the regressed (size, metric) pairs."""
+    regressions = []
+    print(f"\n{'rows':>6} {'metric':<16} {'baseline':>9} {'current':>9} {'ratio':>6}")
+    for size, cur in results["sizes"].items():
+        base = baseline["sizes"].get(size)
+        if base is None:
+            continue
+        for metric in TIMINGS:
+            if metric not in cur or metric not in base:
+                continue
+            ratio = cur[metric] / base[metric] if base[metric] else float("inf")
+            worse = ratio > 1 + tolerance and cur[metric] - base[metric] > NOISE_FLOOR_S
+            if worse:
+                regressions.append((size, metric))
+            print(f"{size:>6} {metric:<16} {base[metric]:>9.3f} {cur[metric]:>9.3f} "
+                  f"{ratio:>5.2f}x{'  SLOWER' if worse else ''}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--sizes", default=DEFAULT_SIZES, help=f"ledger rows per run (default: {DEFAULT_SIZES})")
+    ap.add_argument("--root", default=str(APP_DIR),
+                    help="folder with invoices/ and statements/ (default: this folder)")
+    ap.add_argument("--repeat", type=int, default=3, help="repetitions per measurement (default: 3)")
+    ap.add_argument("--out", help="write results as JSON")
+    ap.add_argument("--baseline", help="compare against this results file")
+    ap.add_argument("--save-baseline", help="also write results to this file as the new baseline")
+    ap.add_argument("--tolerance", type=float, default=0.2,
+                    help="slowdown ratio above 1 counted as a regression (default: 0.2)")
+    ap.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    root = Path(args.root).resolve()
+    if args.child is not None:
+        sys.path.insert(0, str(APP_DIR))
+        Path(args.out).write_text(json.dumps(run_size(args.child, root, args.repeat)))
+        return 0
+
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "python":   platform.python_version(),
+            "platform": platform.platform(),
+            "cpus":     os.cpu_count(),
+            "repeat":   args.repeat,
+            "root":     str(root),
+        },
+        "sizes": {},
+    }
+    print(f"{'rows':>6} " + " ".join(f"{m[:12]:>12}" for m in TIMINGS))
+    for rows in (int(s) for s in args.sizes.split(",")):
+        r = measure(rows, root, args.repeat)
+        results["sizes"][str(rows)] = r
+        print(f"{rows:>6} " + " ".join(f"{r[m]:>12.3f}" for m in TIMINGS))
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(results, indent=2) + "\n")
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Content-addressed on-disk store for uploaded documents.
+
+Each upload is written once to ``blobs/<sha[:2]>/<sha256>`` and referenced by
+its hash. Identical files uploaded by different closers, or attached to
+different loans, share a single copy. Sessions hold only references; bytes
+are read back from disk when a thumbnail, viewer or export needs them.
+"""
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+BLOB_DIR = Path(os.environ.get("EQUITY_BLOB_DIR", Path(__file__).resolve().parent / "blobs"))
+CHUNK    = 1024 * 1024
+
+
+class BlobStore:
+    def __init__(self, root=BLOB_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put(self, src) -> tuple:
+        """Store bytes or a binary file object; return ``(sha256, size)``.
+
+        File objects are streamed in chunks while hashing, so an upload is
+        never copied in memory. Content already in the store is not rewritten.
+        """
+        h    = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if isinstance(src, (bytes, bytearray, memoryview)):
+                    h.update(src)
+                    out.write(src)
+                    size = len(src)
+                else:
+                    src.seek(0)
+                    for chunk in iter(lambda: src.read(CHUNK), b""):
+                        h.update(chunk)
+                        out.write(chunk)
+                        size += len(chunk)
+            digest = h.hexdigest()
+            dest   = self.path(digest)
+            if dest.exists():
+                os.unlink(tmp)
+            else:
+                dest.parent.mkdir(exist_ok=True)
+                os.replace(tmp, dest)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return digest, size
+
+    def doc(self, digest: str, size: int, name: str, ftype: str, account) -> dict:
+        """A document dict (see doc_library) backed by a stored blob."""
+        return {
+            "name":    name,
+            "path":    str(self.path(digest)),
+            "size":    size,
+            "sha256":  digest,
+            "type":    ftype,
+            "account": account,
+        }
+
+
+BLOBS = BlobStore()
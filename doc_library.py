@@ -0,0 +1,233 @@
+"""Lazy index of the local invoices/ and statements/ document library.
+
+Scanning records only each file's name, path, size and mtime. Document bytes
+are read on demand, when a thumbnail, viewer or export actually needs them,
+and content hashes are computed over a memory map and memoised per
+(path, size, mtime), so an unchanged file is hashed once per process.
+
+DocLibrary keeps that index current by polling: each refresh() stats the
+folders, and only new, changed or deleted files touch the index. Stale
+thumbnails for changed files are dropped.
+
+Uploaded documents use the same dict shape, pointing at their file in the
+blob store and carrying its "sha256" (see BlobStore.doc).
+"""
+
+import fnmatch
+import hashlib
+import itertools
+import mmap
+import os
+import threading
+import time
+from pathlib import Path
+
+DOC_GLOB = "*.png"
+# Minimum seconds between two directory polls, per process
+POLL_SECONDS = float(os.environ.get("EQUITY_LIBRARY_POLL_SECONDS", 2.0))
+
+_digests = {}
+_digest_lock = threading.Lock()
+# Library versions are unique across DocLibrary instances, so a registry
+# can tell a rebuilt library from the one it last synced with
+_versions = itertools.count(1)
+
+
+def _entry(path: Path, account, st=None) -> dict:
+    st = st or path.stat()
+    return {
+        "name":    path.name,
+        "path":    str(path),
+        "size":    st.st_size,
+        "mtime":   st.st_mtime_ns,
+        "type":    "image/png",
+        "account": account,
+    }
+
+
+def doc_bytes(fd: dict) -> bytes:
+    """The document's bytes, read from disk."""
+    return Path(fd["path"]).read_bytes()
+
+
+def doc_source(fd: dict):
+    """What to hand st.image: the file's path.
+
+    Streamlit opens and reads a path itself each time the image is built, so
+    only call this for a viewer the user has actually opened.
+    """
+    return fd["path"]
+
+
+def _hash_file(path: str, size: int) -> str:
+    h = hashlib.sha256()
+    if size:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            h.update(mm)
+    return h.hexdigest()
+
+
+def doc_digest(fd: dict) -> str:
+    """SHA-256 of the document's content, computed at most once per version."""
+    digest = fd.get("sha256")
+    if digest is not None:
+        return digest   # uploads know theirs
+    key = (fd["path"], fd["size"], fd["mtime"])
+    with _digest_lock:
+        digest = _digests.get(key)
+    if digest is None:
+        digest = _hash_file(fd["path"], fd["size"])
+        with _digest_lock:
+            _digests[key] = digest
+    return digest
+
+
+def forget_digest(fd: dict):
+    """Drop the memoised hash of an indexed file, returning it if it was known."""
+    with _digest_lock:
+        return _digests.pop((fd["path"], fd["size"], fd["mtime"]), None)
+
+
+# ── INCREMENTAL LIBRARY ───────────────────────────────────────────────────────
+class DocLibrary:
+    """Document index kept current by cheap mtime polling.
+
+    ``version`` increases whenever a file is added, changed or removed, so
+    callers can tell when derived state needs rebuilding.
+    """
+
+    def __init__(self, root=".", poll_seconds: float = POLL_SECONDS, on_change=None):
+        self.root         = Path(root)
+        self.poll_seconds = poll_seconds
+        self.on_change    = on_change
+        self.version      = None
+        self._entries     = {}
+        self._snapshot    = ([], [], {})
+        self._last_poll   = 0.0
+        self._lock        = threading.Lock()
+        self.refresh(force=True)
+
+    def snapshot(self):
+        """``(invoices, statements, statements_by_account)`` as of the last refresh."""
+        return self._snapshot
+
+    def _stat_all(self) -> dict:
+        found = {}
+        def _scan(folder: Path, account):
+            try:
+                with os.scandir(folder) as it:
+                    for de in it:
+                        if de.is_file() and fnmatch.fnmatch(de.name, DOC_GLOB):
+                            found[de.path] = (account, de.stat())
+            except FileNotFoundError:
+                pass
+        _scan(self.root / "invoices", None)
+        stmt_dir = self.root / "statements"
+        if stmt_dir.is_dir():
+            for acct_dir in os.scandir(stmt_dir):
+                if acct_dir.is_dir():
+                    _scan(Path(acct_dir.path), acct_dir.name)
+        return found
+
+    def refresh(self, force: bool = False) -> bool:
+        """Re-stat the folders (at most every ``poll_seconds``) and apply changes.
+
+        Returns True if anything was added, updated or removed.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_poll < self.poll_seconds:
+            return False
+        with self._lock:
+            if not force and now - self._last_poll < self.poll_seconds:
+                return False
+            self._last_poll = now
+            found   = self._stat_all()
+            stale   = [self._entries.pop(p) for p in list(self._entries) if p not in found]
+            added   = 0
+            for path, (account, st) in found.items():
+                old = self._entries.get(path)
+                if old is None:
+                    added += 1
+                elif (old["size"], old["mtime"], old["account"]) != (st.st_size, st.st_mtime_ns, account):
+                    stale.append(old)
+                else:
+                    continue
+                self._entries[path] = _entry(Path(path), account, st)
+            if not stale and not added:
+                return False
+            # Digests are only known for files that were actually hashed
+            digests = [d for d in map(forget_digest, stale) if d]
+            self._snapshot = self._build_snapshot()
+            self.version = next(_versions)
+        if self.on_change is not None and digests:
+            self.on_change(digests)
+        return True
+
+    def _build_snapshot(self):
+        inv_files, stmt_files, stmt_by_acct = [], [], {}
+        for fd in sorted(self._entries.values(), key=lambda f: (f["account"] or "", f["name"])):
+            if fd["account"] is None:
+                inv_files.append(fd)
+            else:
+                stmt_files.append(fd)
+                stmt_by_acct.setdefault(fd["account"], []).append(fd)
+        return inv_files, stmt_files, stmt_by_acct
+
+
+# ── REGISTRY ──────────────────────────────────────────────────────────────────
+class DocRegistry:
+    """One session's view of the library plus its uploads, indexed by name."""
+
+    def __init__(self):
+        self.uploads         = []
+        self.library_version = None
+        self._reset([], [], {})
+
+    def _reset(self, inv_files, stmt_files, stmt_by_acct):
+        self.invoices    = list(inv_files)
+        self.statements  = list(stmt_files)
+        self.by_account  = {acct: list(files) for acct, files in stmt_by_acct.items()}
+        # Always present (and last) so the option appears in the sourcing dropdown
+        self.by_account["other_docs"] = []
+        self._inv_names  = {}
+        self._stmt_names = {}
+        for fd in self.invoices:
+            self._inv_names.setdefault(fd["name"], fd)
+        for fd in self.statements:
+            self._stmt_names.setdefault(fd["name"], fd)
+
+    def _index(self, fd: dict):
+        if fd["account"] is None:
+            self.invoices.append(fd)
+            self._inv_names.setdefault(fd["name"], fd)
+        else:
+            self.statements.append(fd)
+            self._stmt_names.setdefault(fd["name"], fd)
+            self.by_account.setdefault(fd["account"], []).append(fd)
+            self.by_account["other_docs"] = self.by_account.pop("other_docs")
+
+    def sync(self, library: DocLibrary) -> bool:
+        """Rebuild from the library if it changed since the last sync."""
+        version = library.version
+        if version == self.library_version:
+            return False
+        self._reset(*library.snapshot())
+        self.library_version = version
+        for fd in self.uploads:
+            self._index(fd)
+        return True
+
+    def add_upload(self, fd: dict) -> bool:
+        """Register an uploaded document; False if one of that name is already known."""
+        names = self._inv_names if fd["account"] is None else self._stmt_names
+        if fd["name"] in names:
+            return False
+        self.uploads.append(fd)
+        self._index(fd)
+        return True
+
+    def invoice(self, name: str):
+        return self._inv_names.get(name)
+
+    def statement(self, name: str):
+        return self._stmt_names.get(name)
@@ -0,0 +1,79 @@
+"""Background export jobs for the closing package.
+
+Exports run on a small process-wide thread pool instead of the Streamlit
+script thread. The export function receives a ``progress(done, total)``
+callback; calling it after a cancel request raises ExportCancelled, which
+unwinds the export at the next page boundary.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+EXPORT_JOB_THREADS = int(os.environ.get("EQUITY_EXPORT_JOB_THREADS", 2))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class ExportJob:
+    """State of one submitted export, polled by the UI on later reruns."""
+
+    def __init__(self, label: str):
+        self.label    = label
+        self.done     = 0
+        self.total    = 0
+        self.result   = None
+        self.error    = None
+        self.started  = None
+        self.finished = None
+        self._cancel  = threading.Event()
+        self._future  = None
+
+    @property
+    def fraction(self) -> float:
+        return min(1.0, self.done / self.total) if self.total else 0.0
+
+    def progress(self, done: int, total: int):
+        if self._cancel.is_set():
+            raise ExportCancelled(self.label)
+        self.done, self.total = done, total
+
+    def cancel(self):
+        self._cancel.set()
+        if self._future is not None:
+            self._future.cancel()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=EXPORT_JOB_THREADS, thread_name_prefix="export"
+            )
+        return _executor
+
+
+def submit_export(label: str, fn, *args, **kwargs) -> ExportJob:
+    """Run ``fn(*args, progress=job.progress, **kwargs)`` in the background."""
+    job = ExportJob(label)
+
+    def _run():
+        job.started = time.time()
+        try:
+            job.result = fn(*args, progress=job.progress, **kwargs)
+        except ExportCancelled:
+            pass
+        except Exception as e:
+            job.error = e
+        finally:
+            job.finished = time.time()
+
+    job._future = _get_executor().submit(_run)
+    return job
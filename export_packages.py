@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Build closing package PDFs for many loans without the web app.
+
+Each ledger CSV is one loan. Its documents are read from ``invoices/`` and
+``statements/<account>/`` next to the CSV (or under ``--docs``), and an
+optional ``loan.json`` beside it supplies the loan name and amounts.
+
+Documents are matched to ledger rows the way a closer would pick them: the
+invoice whose file name starts with the row's Invoice#, and the statement for
+the row's month in the account folder ending with its last four digits.
+
+Loans are exported in parallel, one per worker process:
+
+    python export_packages.py loans/*/ledger.csv --out packages --jobs 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+
+import pandas as pd
+
+from doc_library import DocLibrary, doc_bytes
+from package_pdf import DEFAULT_PROFILE, EXPORT_PROFILES, build_package_pdf, package_inputs
+
+LEDGER_COLUMNS = ["Funds Used For", "Date", "Vendor Name", "Amount",
+                  "Bank Account#", "Invoice#", "Sourced", "UOP Item"]
+
+
+# ── INPUTS ────────────────────────────────────────────────────────────────────
+def read_ledger(csv_path) -> pd.DataFrame:
+    df = pd.read_csv(csv_path)
+    df["Sourced"]       = df["Sourced"].astype(bool)
+    df["Amount"]        = df["Amount"].astype(float)
+    df["Date"]          = df["Date"].astype(str)
+    df["Bank Account#"] = df["Bank Account#"].astype(str)
+    df["Invoice#"]      = df["Invoice#"].fillna("").astype(str)
+    if "UOP Item" not in df.columns:
+        df["UOP Item"] = ""
+    df["UOP Item"] = df["UOP Item"].fillna("").astype(str)
+    return df[LEDGER_COLUMNS]
+
+
+def read_loan(csv_path: Path, equity_required: float, loan_amount: float) -> dict:
+    # resolve() so a bare "ledger.csv" is still named after its folder
+    loan = {
+        "loan_id":         csv_path.resolve().parent.name if csv_path.stem == "ledger" else csv_path.stem,
+        "loan_amount":     loan_amount,
+        "equity_required": equity_required,
+    }
+    loan["name"] = loan["loan_id"]
+    meta = csv_path.parent / "loan.json"
+    if meta.exists():
+        loan.update(json.loads(meta.read_text()))
+    return loan
+
+
+def match_sourcing(row, invoices: list, by_account: dict) -> dict:
+    """A sourcing record for one ledger row, in the shape the app saves."""
+    rec    = {"statements": []}
+    inv_no = str(row["Invoice#"]).strip()
+    if inv_no:
+        inv = next((fd for fd in invoices if fd["name"].startswith(inv_no)), None)
+        if inv is not None:
+            rec["invoice_file_name"] = inv["name"]
+    last4 = "".join(c for c in str(row["Bank Account#"]) if c.isdigit())[-4:]
+    month = str(row["Date"])[:7]
+    if last4:
+        for acct, files in by_account.items():
+            if not acct.endswith(last4):
+                continue
+            stmt = next((fd for fd in files if fd["name"].startswith(month)), None)
+            if stmt is not None:
+                rec["statements"].append(stmt["name"])
+                break
+    return rec
+
+
+def loan_inputs(csv_path: Path, docs_root: Path, loan: dict) -> dict:
+    """The export snapshot build_package_pdf expects, built from files on disk."""
+    df = read_ledger(csv_path)
+    invoices, statements, by_account = DocLibrary(docs_root).snapshot()
+    sourcing = {idx: match_sourcing(row, invoices, by_account) for idx, row in df.iterrows()}
+    inv_by_name  = {fd["name"]: fd for fd in invoices}
+    stmt_by_name = {fd["name"]: fd for fd in statements}
+
+    def _lookup(by_name):
+        return lambda name: partial(doc_bytes, by_name[name]) if name in by_name else None
+
+    return package_inputs(loan, df, sourcing, _lookup(inv_by_name), _lookup(stmt_by_name))
+
+
+# ── EXPORT ────────────────────────────────────────────────────────────────────
+def export_loan(csv_path: str, docs_root: str, out_dir: str, final: bool,
+                profile: str, equity_required: float, loan_amount: float) -> dict:
+    """Build one loan's package and write it to ``out_dir``; returns its stats."""
+    t0      = time.perf_counter()
+    csv     = Path(csv_path)
+    loan    = read_loan(csv, equity_required, loan_amount)
+    inputs  = loan_inputs(csv, Path(docs_root) if docs_root else csv.parent, loan)
+    t1      = time.perf_counter()
+    pages   = [0]
+
+    def _progress(done, total):
+        pages[0] = total
+
+    # One loan per process already saturates the CPUs; render its pages inline
+    pdf  = build_package_pdf(inputs, watermark=not final, profile=profile,
+                             progress=_progress, workers=1)
+    kind = "final" if final else "draft"
+    out  = Path(out_dir) / f"{loan['loan_id']}_{kind}.pdf"
+    out.write_bytes(pdf)
+    t2   = time.perf_counter()
+    return {
+        "loan_id": loan["loan_id"],
+        "rows":    len(inputs["ledger"]),
+        "pages":   pages[0],
+        "bytes":   len(pdf),
+        "load_s":  t1 - t0,
+        "build_s": t2 - t1,
+        "path":    str(out),
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("ledgers", nargs="+", help="ledger CSV files, one per loan")
+    ap.add_argument("--docs", help="document folder for every loan (default: each CSV's folder)")
+    ap.add_argument("--out", default="packages", help="output folder (default: packages)")
+    ap.add_argument("--final", action="store_true", help="final package, without the draft watermark")
+    ap.add_argument("--profile", choices=list(EXPORT_PROFILES), default=DEFAULT_PROFILE,
+                    help=f"output size/fidelity profile (default: {DEFAULT_PROFILE})")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                    help="loans exported in parallel (default: number of CPUs)")
+    ap.add_argument("--equity-required", type=float, default=0.0,
+                    help="used when a loan has no loan.json")
+    ap.add_argument("--loan-amount", type=float, default=0.0,
+                    help="used when a loan has no loan.json")
+    args = ap.parse_args(argv)
+
+    # Packages are named by loan ID, so two ledgers with one ID would overwrite each other
+    by_id = {}
+    for csv in args.ledgers:
+        loan_id = read_loan(Path(csv), args.equity_required, args.loan_amount)["loan_id"]
+        by_id.setdefault(loan_id, []).append(csv)
+    dupes = {loan_id: csvs for loan_id, csvs in by_id.items() if len(csvs) > 1}
+    if dupes:
+        ap.error("ledgers share a loan ID: " + "; ".join(
+            f"{loan_id} ({', '.join(csvs)})" for loan_id, csvs in dupes.items()))
+
+    Path(args.out).mkdir(parents=True, exist_ok=True)
+    job_args = [
+        (csv, args.docs, args.out, args.final, args.profile,
+         args.equity_required, args.loan_amount)
+        for csv in args.ledgers
+    ]
+    t0 = time.perf_counter()
+    failed, total_bytes = 0, 0
+    print(f"{'loan':<32} {'rows':>6} {'pages':>6} {'size':>10} {'load s':>7} {'build s':>8}")
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(job_args)))) as pool:
+        futures = {pool.submit(export_loan, *a): a[0] for a in job_args}
+        for fut in as_completed(futures):
+            try:
+                r = fut.result()
+            except Exception as e:
+                failed += 1
+                print(f"{futures[fut]}: failed: {e}", file=sys.stderr)
+                continue
+            total_bytes += r["bytes"]
+            print(f"{r['loan_id'][:32]:<32} {r['rows']:>6} {r['pages']:>6} "
+                  f"{r['bytes'] / 1024:>8.0f}KB {r['load_s']:>7.2f} {r['build_s']:>8.2f}")
+    print(f"{len(job_args) - failed} of {len(job_args)} {args.profile} packages, "
+          f"{total_bytes / (1024 * 1024):,.1f} MB in {time.perf_counter() - t0:.2f}s -> {args.out}/")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
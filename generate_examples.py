@@ -1,11 +1,30 @@
 #!/usr/bin/env python3
-"""Generates example invoice and bank statement PNG documents for the demo."""
+"""Generates example invoice and bank statement PNG documents for the demo.
 
+Run without arguments to write the demo documents. With any of the scale
+options it instead writes a seeded synthetic corpus for load testing: one
+``loans/<loan_id>/`` folder per loan holding ``ledger.csv``, ``loan.json``,
+``invoices/`` and ``statements/<account>/``, with every ledger row backed by
+an invoice and a statement line. The same seed always gives the same files.
+
+    python generate_examples.py --loans 20 --rows 400 --accounts 3 --months 12
+"""
+
+import argparse
+import calendar
+import csv
+import json
+import os
+import random
+import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
-from datetime import datetime
+from datetime import date, datetime
 
 W, H = 850, 1100  # Letter-ish portrait
+# Transaction lines that fit on one statement page (rows from y=270, 32px apart)
+STATEMENT_LINES = (H - 130 - 270) // 32 + 1
 
 # ── FONTS ─────────────────────────────────────────────────────────────────────
 def get_fonts():
@@ -136,7 +155,7 @@ INVOICES = [
     },
 ]
 
-def generate_invoice(inv, out_dir):
+def generate_invoice(inv, out_dir, verbose=True):
     img, draw = new_doc()
     draw_header(draw, inv["color"], inv["vendor"], inv["addr"])
     draw.text((W - 170, 28), "INVOICE", fill="white", font=FONTS["title"])
@@ -189,7 +208,8 @@ def generate_invoice(inv, out_dir):
     draw.text((30, H - 20), "SAMPLE DOCUMENT — FOR DEMONSTRATION PURPOSES ONLY", fill="#ccc", font=FONTS["small"])
 
     img.save(out_dir / inv["filename"])
-    print(f"  ✓ invoices/{inv['filename']}")
+    if verbose:
+        print(f"  ✓ invoices/{inv['filename']}")
 
 # ══════════════════════════════════════════════════════════════════════════════
 # BANK STATEMENTS
@@ -339,7 +359,7 @@ ACCOUNTS = [
     },
 ]
 
-def generate_statement(acct, month_data, out_dir):
+def generate_statement(acct, month_data, out_dir, verbose=True):
     month_id, month_label, start_dt, end_dt, opening, txns = month_data
     img, draw = new_doc()
 
@@ -373,11 +393,12 @@ def generate_statement(acct, month_data, out_dir):
     draw.text((648, 242), "Amount",      fill="#555", font=FONTS["small"])
     draw.text((758, 242), "Balance",     fill="#555", font=FONTS["small"])
 
+    if len(txns) > STATEMENT_LINES:
+        raise ValueError(f"{acct['id']} {month_label}: {len(txns)} transactions, "
+                         f"a statement page holds {STATEMENT_LINES}")
     y = 270
     running = opening
     for dt, desc, amount in txns:
-        if y > H - 130:
-            break
         running += amount
         col    = "#196f3d" if amount >= 0 else "#922b21"
         amt_s  = f"+${amount:,.2f}" if amount >= 0 else f"-${abs(amount):,.2f}"
@@ -395,12 +416,217 @@ def generate_statement(acct, month_data, out_dir):
 
     fname = f"{month_id}_{acct['short']}.png"
     img.save(out_dir / fname)
-    print(f"  ✓ {acct['id']}/{fname}")
+    if verbose:
+        print(f"  ✓ {acct['id']}/{fname}")
 
-# ── MAIN ──────────────────────────────────────────────────────────────────────
-if __name__ == "__main__":
-    base = Path(__file__).parent
+# ══════════════════════════════════════════════════════════════════════════════
+# SYNTHETIC CORPUS
+# ══════════════════════════════════════════════════════════════════════════════
+NAME_WORDS  = ["Summit", "Harbor", "Lakeside", "Granite", "Pioneer", "Maple", "Beacon",
+               "Riverside", "Northwind", "Cedar", "Keystone", "Prairie", "Union", "Redwood"]
+TRADES      = ["Moving", "Bakery", "Logistics", "Dental", "Brewing", "Fitness", "Auto Repair",
+               "Landscaping", "Printing", "Veterinary", "Catering", "Cleaning"]
+SUFFIXES    = ["LLC", "Inc", "Co", "Group"]
+STREETS     = ["Commerce Blvd", "Build Ave", "Workspace Dr", "Tech Park Way", "Industrial Pkwy",
+               "Market St", "Enterprise Rd", "Harbor Ln"]
+COLORS      = ["#154360", "#1e8449", "#7d3c98", "#1a5276", "#c0392b", "#7b0d1e", "#1a3a5c", "#b9770e"]
+BANKS       = [("First National Bank", "071000013"), ("Chase Business Banking", "021000021"),
+               ("Wells Fargo Business", "121042882"), ("US Bank Business", "091000022"),
+               ("PNC Business Banking", "043000096"), ("Fifth Third Commercial", "042000314")]
+# UOP item -> (Funds Used For, vendor names, line items)
+SPEND       = {
+    "FF&E":                   ("Furniture & Fixtures", ["Office Outfitters Inc", "Workspace Interiors"],
+                               ["Executive Desk Sets", "Ergonomic Task Chairs", "Filing Cabinets",
+                                "Reception Furniture Set", "Conference Table"]),
+    "M&E":                    ("Equipment Purchase", ["ABC Industrial Supply", "Midwest Machinery"],
+                               ["Hydraulic Lift Platform", "Electric Pallet Jacks", "Air Compressor",
+                                "Industrial Conveyor Belt", "Commercial Oven"]),
+    "Leasehold Improvements": ("Leasehold Improvements", ["Premier Contractors LLC", "Keystone Builders"],
+                               ["Floor Renovation", "Office Buildout", "Loading Dock Construction",
+                                "HVAC Installation", "Electrical Upgrade"]),
+    "Working Capital":        ("Working Capital", ["TechStack Solutions", "Payroll Services Co"],
+                               ["Software Licenses (Annual)", "Payroll Processing", "Initial Inventory",
+                                "Marketing Campaign", "Insurance Premium"]),
+    "Closing Costs":          ("Closing Costs", ["Title & Escrow Partners", "Lakeside Legal"],
+                               ["Title Search", "Escrow Fee", "Legal Review", "Recording Fees"]),
+}
+FILLER      = [("Payroll — bimonthly", -15000, -3000), ("Fuel expense", -1500, -200),
+               ("Utilities", -1200, -150), ("Client payment — {}", 2000, 40000),
+               ("Interest earned", 10, 200), ("Insurance premium", -3000, -800)]
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def _month_range(start: date, months: int) -> list:
+    out, y, m = [], start.year, start.month
+    for _ in range(months):
+        out.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return out
+
+
+def check_capacity(rows: int, accounts: int, months: int, txns: int):
+    """Raise ValueError unless every row's debit fits on a one-page statement."""
+    slots = accounts * months * (STATEMENT_LINES - 1)
+    if rows > slots:
+        raise ValueError(f"{rows} rows do not fit: {accounts} account(s) x {months} month(s) "
+                         f"of one-page statements hold {slots} debits; add --accounts or --months")
+    if txns > STATEMENT_LINES:
+        raise ValueError(f"--txns {txns} is more than the {STATEMENT_LINES} lines "
+                         f"a statement page holds")
+
+
+def synth_loan(seed: int, n: int, rows: int, accounts: int, months: int, txns: int) -> dict:
+    """One synthetic loan: its ledger plus INVOICES/ACCOUNTS-shaped document specs.
+
+    Each loan draws from its own generator, so a loan's content does not
+    depend on how many loans are generated alongside it. Debits are spread so
+    that no statement needs more lines than fit on its page.
+    """
+    check_capacity(rows, accounts, months, txns)
+    rng   = random.Random(f"{seed}:{n}")
+    name  = f"{rng.choice(NAME_WORDS)} {rng.choice(TRADES)} {rng.choice(SUFFIXES)}"
+    loan  = {"loan_id": f"{_slug(name)}-{n:03d}", "name": name}
+    addr  = f"{rng.randint(100, 9999)} {rng.choice(STREETS)}, Chicago, IL 606{rng.randint(10, 99)}"
+    span  = _month_range(date(2024 + rng.randint(0, 1), rng.randint(1, 12), 1), months)
 
+    accts = []
+    for last4 in rng.sample(range(1000, 10000), accounts):
+        bank, routing = rng.choice(BANKS)
+        kind = rng.choice(["Business Checking", "Business Savings", "Operating Account"])
+        accts.append({
+            "id":        f"account_{last4}",
+            "bank":      bank,
+            "short":     bank.replace(" ", "-"),
+            "acct_name": f"{name} — {kind}",
+            "acct_num":  f"****{last4}",
+            "routing":   routing,
+            "color":     rng.choice(COLORS),
+            "months":    [],
+        })
+
+    ledger, invoices = [], []
+    debits = {}   # (account index, month index) -> [(day, description, amount)]
+    for r in range(1, rows + 1):
+        uop            = rng.choice(list(SPEND))
+        funds, vendors, goods = SPEND[uop]
+        vendor         = rng.choice(vendors)
+        a, mi          = rng.randrange(accounts), rng.randrange(months)
+        if len(debits.get((a, mi), ())) >= STATEMENT_LINES - 1:
+            # Full (one line stays free for an equity injection): use another month
+            a, mi = rng.choice([(sa, sm) for sa in range(accounts) for sm in range(months)
+                                if len(debits.get((sa, sm), ())) < STATEMENT_LINES - 1])
+        y, m           = span[mi]
+        day            = rng.randint(1, calendar.monthrange(y, m)[1])
+        inv_num        = f"INV-{n:03d}-{r:05d}"
+        lines = []
+        for good in rng.sample(goods, rng.randint(1, min(4, len(goods)))):
+            qty  = rng.randint(1, 5)
+            unit = round(rng.uniform(50, 4000), 2)
+            lines.append((good, qty, unit, round(qty * unit, 2)))
+        total = round(sum(l[3] for l in lines), 2)
+        invoices.append({
+            "filename": f"{inv_num}_{vendor.replace(' ', '-').replace('&', 'and')}.png",
+            "inv_num":  inv_num,
+            "vendor":   vendor,
+            "addr":     f"{rng.randint(100, 9999)} {rng.choice(STREETS)}, Chicago, IL 606{rng.randint(10, 99)}",
+            "date":     f"{calendar.month_name[m]} {day}, {y}",
+            "terms":    rng.choice(["Due Upon Receipt", "Net 15", "Net 30"]),
+            "bill_to":  f"{name}\n{addr}",
+            "items":    lines,
+            "total":    total,
+            "color":    rng.choice(COLORS),
+        })
+        debits.setdefault((a, mi), []).append((day, f"{vendor} — {inv_num}", -total))
+        ledger.append({
+            "Funds Used For": funds,
+            "Date":           f"{y:04d}-{m:02d}-{day:02d}",
+            "Vendor Name":    vendor,
+            "Amount":         f"{total:.2f}",
+            "Bank Account#":  accts[a]["acct_num"],
+            "Invoice#":       inv_num,
+            "Sourced":        rng.random() < 0.3,
+            "UOP Item":       uop,
+        })
+
+    for a, acct in enumerate(accts):
+        balance = round(rng.uniform(20000, 150000), 2)
+        for mi, (y, m) in enumerate(span):
+            days  = calendar.monthrange(y, m)[1]
+            lines = list(debits.get((a, mi), []))
+            # Fund the month's equity spend so balances stay plausible
+            spend = -sum(amt for _, _, amt in lines)
+            if spend > balance:
+                lines.append((1, "Equity injection — owner deposit", round(spend - balance + 10000, 2)))
+            while len(lines) < txns:
+                desc, lo, hi = rng.choice(FILLER)
+                lines.append((rng.randint(1, days),
+                              desc.format(f"{rng.choice(NAME_WORDS)} Corp"),
+                              round(rng.uniform(lo, hi), 2)))
+            # Deposits first within a day
+            lines.sort(key=lambda t: (t[0], t[2] < 0))
+            acct["months"].append((
+                f"{y:04d}-{m:02d}", f"{calendar.month_name[m]} {y}",
+                f"{m:02d}/01/{y % 100:02d}", f"{m:02d}/{days:02d}/{y % 100:02d}", balance,
+                [(f"{m:02d}/{d:02d}", desc, amt) for d, desc, amt in lines],
+            ))
+            balance = round(balance + sum(amt for _, _, amt in lines), 2)
+
+    total = sum(float(row["Amount"]) for row in ledger)
+    loan["equity_required"] = round(total * rng.uniform(0.8, 1.1), -3)
+    loan["loan_amount"]     = round(loan["equity_required"] * rng.choice([5, 8, 10]), -3)
+    return {"loan": loan, "ledger": ledger, "invoices": invoices, "accounts": accts}
+
+
+def render_job(job: tuple):
+    kind, spec, out_dir, *month = job
+    if kind == "invoice":
+        generate_invoice(spec, Path(out_dir), verbose=False)
+    else:
+        generate_statement(spec, month[0], Path(out_dir), verbose=False)
+
+
+def generate_corpus(out: Path, loans: int, rows: int, accounts: int, months: int,
+                    txns: int, seed: int, jobs: int):
+    """Write ``loans`` synthetic loans under ``out/loans/`` and render their documents."""
+    columns = ["Funds Used For", "Date", "Vendor Name", "Amount",
+               "Bank Account#", "Invoice#", "Sourced", "UOP Item"]
+    render  = []
+    for n in range(1, loans + 1):
+        spec     = synth_loan(seed, n, rows, accounts, months, txns)
+        loan_dir = out / "loans" / spec["loan"]["loan_id"]
+        inv_dir  = loan_dir / "invoices"
+        inv_dir.mkdir(parents=True, exist_ok=True)
+        (loan_dir / "loan.json").write_text(json.dumps(spec["loan"], indent=2) + "\n")
+        with open(loan_dir / "ledger.csv", "w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=columns)
+            w.writeheader()
+            w.writerows(spec["ledger"])
+        render += [("invoice", inv, str(inv_dir)) for inv in spec["invoices"]]
+        for acct in spec["accounts"]:
+            acct_dir = loan_dir / "statements" / acct["id"]
+            acct_dir.mkdir(parents=True, exist_ok=True)
+            # The month list is passed separately, so each job carries one month
+            header = {k: v for k, v in acct.items() if k != "months"}
+            render += [("statement", header, str(acct_dir), md) for md in acct["months"]]
+        print(f"  {spec['loan']['loan_id']}: {rows} rows, "
+              f"{rows + accounts * months} documents")
+
+    print(f"\nRendering {len(render)} documents on {jobs} process(es)...")
+    if jobs <= 1:
+        for job in render:
+            render_job(job)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for _ in pool.map(render_job, render, chunksize=16):
+                pass
+    print(f"\n✅ Done! {loans} loans written to {out / 'loans'}/")
+
+
+# ── MAIN ──────────────────────────────────────────────────────────────────────
+def generate_demo(base: Path):
     inv_dir = base / "invoices"
     inv_dir.mkdir(exist_ok=True)
     print(f"\nGenerating invoices → {inv_dir}/")
@@ -417,3 +643,29 @@ if __name__ == "__main__":
             generate_statement(acct, month_data, acct_dir)
 
     print("\n✅ Done! All example documents generated.")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    scale = ap.add_argument_group("synthetic corpus (any of these switches it on)")
+    scale.add_argument("--loans",    type=int, help="number of loans (default 1)")
+    scale.add_argument("--rows",     type=int, help="ledger rows per loan (default 50)")
+    scale.add_argument("--accounts", type=int, help="bank accounts per loan (default 3)")
+    scale.add_argument("--months",   type=int, help="statement months per account (default 6)")
+    scale.add_argument("--txns",     type=int, help="minimum transactions per statement (default 8)")
+    ap.add_argument("--seed", type=int, default=0, help="random seed (default 0)")
+    ap.add_argument("--out",  default=str(Path(__file__).parent),
+                    help="folder to write loans/ into (default: this folder)")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                    help="render processes (default: number of CPUs)")
+    args = ap.parse_args()
+
+    if all(v is None for v in (args.loans, args.rows, args.accounts, args.months, args.txns)):
+        generate_demo(Path(__file__).parent)
+    else:
+        sizes = (args.rows or 50, args.accounts or 3, args.months or 6, args.txns or 8)
+        try:
+            check_capacity(*sizes)
+        except ValueError as e:
+            ap.error(str(e))
+        generate_corpus(Path(args.out), args.loans or 1, *sizes, args.seed, args.jobs)
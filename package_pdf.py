@@ -0,0 +1,623 @@
+"""Rendering and assembly of the closing package PDF.
+
+Everything here is plain PIL and pdf_writer with no Streamlit imports, so
+packages can be built in worker processes and from the command line.
+``render_pages`` fans raster document pages out over a process pool and
+yields them back in ledger order, reusing pages from a process-wide cache
+whenever their inputs have not changed. ``package_inputs`` turns a ledger,
+its sourcing records and a document lookup into an export snapshot, and
+``build_package_pdf`` assembles a whole package from one. Importing this
+module has no side effects beyond defining the page cache.
+"""
+
+import hashlib
+import io
+import multiprocessing as mp
+import os
+import threading
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, partial
+
+from pdf_writer import PageCanvas, PdfStreamWriter, sniff_type
+from rollup import UOP_ITEMS, compute_rollup
+
+# ── LAYOUT ────────────────────────────────────────────────────────────────────
+PAGE_W, PAGE_H = 1200, 1650
+MARGIN       = 60
+BANNER_H     = 130          # slightly taller to fit closer notes line
+BG           = (255, 255, 255)
+BANNER_BG    = (13, 110, 253)
+BANNER_FG    = (255, 255, 255)
+NOTES_FG     = (180, 210, 255)   # lighter blue for closer notes in banner
+TEXT_C       = (33, 37, 41)
+MUTED_C      = (108, 117, 125)
+GREEN_C      = (25, 135, 84)
+RED_C        = (220, 53, 69)
+DIVIDER_C    = (222, 226, 230)
+
+WATERMARK_TEXT = "DRAFT - FOR REVIEW ONLY"
+# Grey level at or above which a bilevel page pixel turns white
+BILEVEL_CUTOFF = 215
+
+# ── EXPORT PROFILES ───────────────────────────────────────────────────────────
+# passthrough  embed original documents without re-encoding where possible
+# scale        resolution of re-rendered document pages (and of the images in
+#              imported PDFs), relative to the layout
+# statements   "color", "gray" or "bilevel" for re-rendered bank statements
+# encoding     "jpeg" (lossy, at quality) or "flate" (lossless) for colour and
+#              grey pages; bilevel pages are always 1-bit Flate
+EXPORT_PROFILES = {
+    "high-fidelity": {
+        "label":       "High fidelity",
+        "description": "Original files embedded unchanged; largest output.",
+        "passthrough": True,  "scale": 1.0, "statements": "color",   "encoding": "jpeg", "quality": 90,
+    },
+    "archive": {
+        "label":       "Archive",
+        "description": "Documents re-encoded losslessly; statements in greyscale.",
+        "passthrough": False, "scale": 1.0, "statements": "gray",    "encoding": "flate", "quality": None,
+    },
+    "email-size": {
+        "label":       "Email-size",
+        "description": "Reduced resolution, black-and-white statements; smallest output.",
+        "passthrough": False, "scale": 0.6, "statements": "bilevel", "encoding": "jpeg", "quality": 45,
+    },
+}
+DEFAULT_PROFILE = "high-fidelity"
+
+# ── PARALLELISM ───────────────────────────────────────────────────────────────
+# Worker processes used for raster document pages; 1 renders inline.
+EXPORT_WORKERS     = int(os.environ.get("EQUITY_EXPORT_WORKERS", os.cpu_count() or 1))
+# Below this many raster pages the pool costs more than it saves.
+PARALLEL_MIN_PAGES = int(os.environ.get("EQUITY_PARALLEL_MIN_PAGES", 8))
+
+_pool = None
+_pool_workers = 0
+# Up to EQUITY_EXPORT_JOB_THREADS exports share the pool at once
+_pool_lock = threading.Lock()
+
+# ── PAGE CACHE ────────────────────────────────────────────────────────────────
+class PageCache:
+    """Thread-safe LRU of encoded pages, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes     = 0
+        self.hits      = 0
+        self.misses    = 0
+        self._pages    = OrderedDict()
+        self._lock     = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key: str, page: tuple):
+        size = len(page[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[0])
+            self._pages[key] = page
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._pages.popitem(last=False)
+                self.bytes -= len(evicted[0])
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self.bytes = 0
+
+# Shared by every session in the process; keys are content hashes, so two
+# closers with identical pages simply share the entry.
+PAGE_CACHE = PageCache(int(os.environ.get("EQUITY_PAGE_CACHE_MB", 256)) * 1024 * 1024)
+
+def page_key(job: tuple) -> str:
+    """Cache key for a document page: every input that affects its pixels."""
+    doc_data, render = job
+    h = hashlib.sha256(repr(render).encode("utf-8"))
+    h.update(hashlib.sha256(doc_data).digest())
+    return h.hexdigest()
+
+# ── FONTS ─────────────────────────────────────────────────────────────────────
+@lru_cache(maxsize=1)
+def load_pkg_fonts():
+    from PIL import ImageFont
+    candidates = [
+        "/System/Library/Fonts/Helvetica.ttc",
+        "/System/Library/Fonts/Arial.ttf",
+        "/Library/Fonts/Arial.ttf",
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    ]
+    def _try(size):
+        for fp in candidates:
+            try:
+                return ImageFont.truetype(fp, size)
+            except Exception:
+                continue
+        try:
+            return ImageFont.load_default(size=size)
+        except Exception:
+            return ImageFont.load_default()
+    return {
+        "title": _try(30),
+        "lg":    _try(24),
+        "md":    _try(19),
+        "sm":    _try(15),
+        "xs":    _try(12),
+    }
+
+# ── DOCUMENT PAGES ────────────────────────────────────────────────────────────
+def render_settings(profile: dict, doc_type: str) -> tuple:
+    """``(scale, color, encoding, quality)`` for one re-rendered document page."""
+    color = profile["statements"] if doc_type.startswith("Statement") else "color"
+    return profile["scale"], color, profile["encoding"], profile["quality"]
+
+def encode_page(img, color: str, encoding: str, quality: int) -> tuple:
+    """Encode a rendered page as ``(kind, data, width, height, mode)``.
+
+    ``kind`` is what PdfStreamWriter.embed_encoded expects: "jpeg", "png" or
+    "bilevel" (zlib-compressed 1-bit rows).
+    """
+    if color == "bilevel":
+        bw = img.convert("L").point(lambda v: 255 if v >= BILEVEL_CUTOFF else 0, mode="1")
+        return "bilevel", zlib.compress(bw.tobytes(), 9), bw.width, bw.height, "1"
+    if color == "gray":
+        img = img.convert("L")
+    buf = io.BytesIO()
+    if encoding == "flate":
+        img.save(buf, format="PNG", compress_level=6)
+        return "png", buf.getvalue(), img.width, img.height, img.mode
+    img.save(buf, format="JPEG", quality=quality)
+    return "jpeg", buf.getvalue(), img.width, img.height, img.mode
+
+def render_doc_page(job: tuple):
+    """Render the document area of one page; returns an encode_page tuple.
+
+    ``job`` is ``(doc_data, render)`` with ``render`` from render_settings;
+    it is a plain tuple so it pickles cheaply to worker processes. The image
+    covers the page below the banner. The banner and any watermark are drawn
+    over it as vector text, so thresholding never touches them and a page
+    is cached once for every row, note and watermark it appears with.
+    """
+    from PIL import Image, ImageDraw
+
+    doc_data, render = job
+    scale, color, encoding, quality = render
+    body_h = PAGE_H - BANNER_H
+    pg     = Image.new("RGB", (PAGE_W, body_h), BG)
+    try:
+        doc_img  = Image.open(io.BytesIO(doc_data)).convert("RGB")
+        avail_w  = PAGE_W - 2 * MARGIN
+        avail_h  = body_h - 2 * MARGIN
+        doc_img.thumbnail((avail_w, avail_h), Image.LANCZOS)
+        x_off    = MARGIN + (avail_w - doc_img.width) // 2
+        pg.paste(doc_img, (x_off, MARGIN))
+    except Exception:
+        ImageDraw.Draw(pg).text((MARGIN, MARGIN + 40), "[Could not load document image]",
+                                font=load_pkg_fonts()["md"], fill=MUTED_C)
+
+    if scale != 1:
+        pg = pg.resize((round(PAGE_W * scale), round(body_h * scale)), Image.LANCZOS)
+    return encode_page(pg, color, encoding, quality)
+
+def recode_pdf_image(render: tuple, img) -> tuple:
+    """Re-encode an image from an imported PDF page to match ``render``.
+
+    Images are capped at the size the whole document area has at the
+    profile's scale; see PdfStreamWriter.embed_pdf_pages for ``img``.
+    """
+    from PIL import Image
+
+    scale = render[0]
+    img.thumbnail((round((PAGE_W - 2 * MARGIN) * scale),
+                   round((PAGE_H - BANNER_H - 2 * MARGIN) * scale)), Image.LANCZOS)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    return encode_page(img, *render[1:])
+
+# ── PROCESS POOL ──────────────────────────────────────────────────────────────
+def get_render_pool(workers: int) -> ProcessPoolExecutor:
+    """Shared render pool, created on first use and kept for later exports."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                # Another export may still be waiting on this pool; let its
+                # queued pages finish rather than cancelling them
+                _pool.shutdown(wait=False)
+            # Under Streamlit, __main__ is the app script itself, and spawn /
+            # forkserver workers would re-run the whole app on start-up. Forked
+            # workers only ever execute render_doc_page: pure PIL, with no
+            # logging, SQLite or Streamlit calls, so locks held by the server's
+            # other threads at fork time are never touched in the child.
+            method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context(method))
+            _pool_workers = workers
+        return _pool
+
+def discard_render_pool(pool: ProcessPoolExecutor):
+    """Drop ``pool`` after a worker died, unless it was already replaced."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+def render_pages(jobs, workers: int = None, cache: PageCache = PAGE_CACHE, size_hint: int = None):
+    """Yield ``render_doc_page(job)`` for each job, in the order given.
+
+    ``jobs`` may be a generator: it is pulled at most ``2 * workers`` pages
+    ahead of the output, so a job's document bytes are read just before its
+    page is rendered and never pile up ahead of the PDF writer. A None job
+    yields None. Pages whose inputs match a cached page are reused; the rest
+    are rendered, on the shared process pool when ``size_hint`` (the number
+    of jobs, if known) makes it worthwhile, and added to the cache. If a
+    worker dies or the pool is shut down under us, pages are rendered inline.
+    """
+    workers = EXPORT_WORKERS if workers is None else workers
+    if size_hint is not None and size_hint < PARALLEL_MIN_PAGES:
+        workers = 1
+    pool   = get_render_pool(workers) if workers > 1 else None
+    ahead  = 2 * workers if pool is not None else 0
+    window = deque()   # (key, job, cached page | Future | None)
+
+    def _start(job):
+        if job is None:
+            return None, None, None
+        key  = page_key(job) if cache is not None else None
+        page = cache.get(key) if cache is not None else None
+        if page is None and pool is not None:
+            try:
+                page = pool.submit(render_doc_page, job)
+            except RuntimeError:
+                pass   # shut down by an export that resized the pool
+        return key, job, page
+
+    def _finish(entry):
+        nonlocal pool
+        key, job, page = entry
+        if job is None:
+            return None
+        fresh = not isinstance(page, tuple)
+        if isinstance(page, Future):
+            try:
+                page = page.result()
+            except BrokenProcessPool:
+                if pool is not None:
+                    discard_render_pool(pool)
+                    pool = None
+                page = None
+            except CancelledError:
+                page = None
+        if page is None:
+            page = render_doc_page(job)
+        if fresh and cache is not None:
+            cache.put(key, page)
+        return page
+
+    try:
+        for job in jobs:
+            window.append(_start(job))
+            if len(window) > ahead:
+                yield _finish(window.popleft())
+        while window:
+            yield _finish(window.popleft())
+    finally:
+        # An abandoned export (e.g. cancelled) drops its queued pages
+        for _, _, page in window:
+            if isinstance(page, Future):
+                page.cancel()
+
+# ── TABLE PAGES ───────────────────────────────────────────────────────────────
+ROW_H        = 26
+TABLE_TOP    = MARGIN + 42 + 28 + 18 + 20 + 10   # title, subtitle, rule, column heads
+TABLE_BOTTOM = PAGE_H - MARGIN - 24               # leaves room for the page footer
+TOTAL_LINE_H = 30
+
+
+def table_layout(n_rows: int, n_total_lines: int) -> list:
+    """Split ``n_rows`` into ``(start, stop)`` ranges, one per page.
+
+    Every page holds as many rows as fit; the totals go below the last row,
+    or on a page of their own when they do not fit under it.
+    """
+    per_page = (TABLE_BOTTOM - TABLE_TOP) // ROW_H
+    pages    = [(i, min(i + per_page, n_rows)) for i in range(0, n_rows, per_page)] or [(0, 0)]
+    start, stop = pages[-1]
+    totals_h = 22 + n_total_lines * TOTAL_LINE_H
+    if TABLE_TOP + (stop - start) * ROW_H + totals_h > TABLE_BOTTOM:
+        pages.append((n_rows, n_rows))
+    return pages
+
+
+def table_pages(title: str, subtitle: str, columns: list, rows: list, totals: list,
+                watermark: bool, layout: list = None):
+    """Yield one PageCanvas per page of a table.
+
+    ``columns`` is ``[(heading, width), ...]``; each row is a list of
+    ``(text, color)`` cells, one per column. ``totals`` lines are lists of
+    ``(column_index, text, color)`` drawn under the last row. The title,
+    subtitle and column headings repeat on every page.
+    """
+    layout = layout or table_layout(len(rows), len(totals))
+    lefts  = [MARGIN + sum(w for _, w in columns[:i]) for i in range(len(columns))]
+    for page_no, (start, stop) in enumerate(layout, 1):
+        page = PageCanvas(PAGE_W, PAGE_H)
+        y = MARGIN
+        page.text(MARGIN, y, title if page_no == 1 else f"{title} (continued)", 30, TEXT_C)
+        y += 42
+        page.text(MARGIN, y, subtitle, 12, MUTED_C)
+        y += 28
+        page.line(MARGIN, y, PAGE_W - MARGIN, y, DIVIDER_C, 2)
+        y += 18
+        for (heading, _), x in zip(columns, lefts):
+            page.text(x, y, heading.upper(), 12, MUTED_C)
+        y += 20
+        page.line(MARGIN, y, PAGE_W - MARGIN, y, DIVIDER_C, 1)
+        y += 10
+
+        for cells in rows[start:stop]:
+            for (text, color), x in zip(cells, lefts):
+                page.text(x, y, text, 15, color)
+            y += ROW_H
+            page.line(MARGIN, y - 5, PAGE_W - MARGIN, y - 5, (240, 240, 240), 1)
+
+        if page_no == len(layout):
+            y += 8
+            page.line(MARGIN, y, PAGE_W - MARGIN, y, DIVIDER_C, 2)
+            y += 14
+            for line in totals:
+                for col, text, color in line:
+                    page.text(lefts[col], y, text, 19, color)
+                y += TOTAL_LINE_H
+        if len(layout) > 1:
+            page.text(MARGIN, PAGE_H - MARGIN, f"Page {page_no} of {len(layout)}", 12, MUTED_C)
+        if watermark:
+            page.watermark(WATERMARK_TEXT)
+        yield page
+
+# ── INPUTS ────────────────────────────────────────────────────────────────────
+def item_label(row_num: int, row) -> str:
+    return (
+        f"{row_num}. {row['Vendor Name']}  -  {row['Funds Used For']}"
+        f"   |   ${float(row['Amount']):,.2f}   |   {row['Date']}"
+    )
+
+
+def package_inputs(loan: dict, ledger, sourcing: dict, invoice, statement,
+                   uop_items: list = UOP_ITEMS, rollup: dict = None) -> dict:
+    """Export snapshot for build_package_pdf from plain ledger and document inputs.
+
+    ``sourcing`` maps ledger row IDs to sourcing records as the app saves them
+    (``invoice_file_name``, ``invoice_notes``, ``statements``,
+    ``statement_notes``). ``invoice(name)`` and ``statement(name)`` return a
+    no-argument callable that reads the document's bytes, or None if it is
+    missing; nothing is read until build_package_pdf reaches the page. Pass
+    ``rollup`` if it is already computed for this ledger.
+    """
+    ledger = ledger.copy()
+    items  = []
+    for row_num, (idx, row) in enumerate(ledger.iterrows(), 1):
+        rec  = sourcing.get(idx) or {}
+        docs = []
+        inv_name = rec.get("invoice_file_name")
+        if inv_name:
+            docs.append(("Invoice", invoice(inv_name), (rec.get("invoice_notes") or "").strip()))
+        notes = rec.get("statement_notes") or []
+        for j, sname in enumerate(rec.get("statements") or [], 1):
+            stmt_notes = notes[j-1] if j-1 < len(notes) else ""
+            docs.append((f"Statement {j}", statement(sname), (stmt_notes or "").strip()))
+        items.append((item_label(row_num, row), docs or [("No Documents Attached", None, "")]))
+    if rollup is None:
+        rollup = compute_rollup(ledger, uop_items, loan["equity_required"])
+    return {"loan": dict(loan), "ledger": ledger, "rollup": rollup, "items": items}
+
+# ── PACKAGE ───────────────────────────────────────────────────────────────────
+def build_package_pdf(inputs: dict, watermark: bool = False, profile: str = DEFAULT_PROFILE,
+                      progress=None, workers: int = None) -> bytes:
+    """Build the closing package PDF from an export snapshot (see package_inputs).
+
+    ``inputs`` holds ``loan`` (dict), ``ledger`` (DataFrame), ``rollup``
+    (rollup.compute_rollup result) and ``items``: one
+    ``(item_label, [(doc_type, load | None, closer_notes), ...])`` per ledger
+    row, where ``load()`` returns the document's bytes. Each document is read
+    only just before its pages are rendered. ``profile`` names an
+    EXPORT_PROFILES entry. ``workers`` is passed on to render_pages.
+    """
+    from PIL import Image
+
+    settings = EXPORT_PROFILES[profile]
+    loan     = inputs["loan"]
+    df       = inputs["ledger"]
+    rollup   = inputs["rollup"]
+
+    # Pages are streamed to the writer as they are rendered and then dropped,
+    # so only one full-size raster is alive at a time.
+    buf    = io.BytesIO()
+    writer = PdfStreamWriter(buf)
+
+    def _banner(canvas, item_label, title, closer_notes):
+        canvas.rect(0, 0, PAGE_W, BANNER_H, BANNER_BG)
+        canvas.text(MARGIN, 14, item_label[:95], 15, BANNER_FG)
+        canvas.text(MARGIN, 44, title, 24, BANNER_FG)
+        if closer_notes:
+            canvas.text(MARGIN, 82, closer_notes[:120], 15, NOTES_FG)
+
+    def _vector_doc_pages(item_label, doc_type, doc_data, closer_notes, kind, render) -> bool:
+        # Passthrough: the source document's own image / page streams are copied
+        # into the package and only the banner is drawn, as vector operators.
+        # Imported PDFs keep their text and drawing in every profile; outside
+        # passthrough their images are re-encoded like re-rendered pages.
+        avail_w = PAGE_W - 2 * MARGIN
+        avail_h = PAGE_H - BANNER_H - 2 * MARGIN
+        if not doc_data:
+            placed = [("message", "No document file available for this item.", 0, 0, 0)]
+        elif kind == "pdf":
+            # A missing dependency fails the export; a PDF that cannot be read
+            # gets a page saying why, as there is no raster path to fall back to
+            recode = None if settings["passthrough"] else partial(recode_pdf_image, render)
+            try:
+                forms  = writer.embed_pdf_pages(doc_data, recode)
+                placed = [("form", fid, w, h, min(avail_w / w, avail_h / h)) for fid, w, h in forms]
+            except ImportError as e:
+                raise ImportError(f"{item_label} - {doc_type}: {e}") from e
+            except Exception as e:
+                placed = [("message", f"[Could not import PDF: {e}]"[:90], 0, 0, 0)]
+        else:
+            embedded = writer.embed_image(doc_data)
+            if embedded is None:
+                try:
+                    embedded = writer.embed_pil_image(Image.open(io.BytesIO(doc_data)),
+                                                      settings["quality"] or 90)
+                except Exception:
+                    return False
+            img_id, w, h = embedded
+            placed = [("image", img_id, w, h, min(1.0, avail_w / w, avail_h / h))]
+        if not placed:
+            return False
+
+        for n, (what, obj_id, w, h, scale) in enumerate(placed, 1):
+            title  = doc_type if len(placed) == 1 else f"{doc_type}  (page {n} of {len(placed)})"
+            canvas = PageCanvas(PAGE_W, PAGE_H)
+            _banner(canvas, item_label, title, closer_notes)
+            x_off = MARGIN + (avail_w - w * scale) / 2
+            if what == "message":
+                canvas.text(MARGIN, (PAGE_H + BANNER_H) // 2 - 20, obj_id, 19, MUTED_C)
+            elif what == "form":
+                canvas.form(obj_id, x_off, BANNER_H + MARGIN, scale, h)
+            else:
+                canvas.image(obj_id, x_off, BANNER_H + MARGIN, w * scale, h * scale)
+            if watermark:
+                canvas.watermark(WATERMARK_TEXT)
+            writer.add_canvas_page(canvas)
+        return True
+
+    def _raster_page(page: tuple, item_label, doc_type, closer_notes):
+        # Placed on a canvas so a downscaled page still fills the full page
+        # size; the banner and watermark stay vector text at any profile.
+        img_id, _, _ = writer.embed_encoded(*page)
+        canvas = PageCanvas(PAGE_W, PAGE_H)
+        _banner(canvas, item_label, doc_type, closer_notes)
+        canvas.image(img_id, 0, BANNER_H, PAGE_W, PAGE_H - BANNER_H)
+        if watermark:
+            canvas.watermark(WATERMARK_TEXT)
+        writer.add_canvas_page(canvas)
+
+    # The ledger and roll-up pages are native text and vector lines: a few KB
+    # each, searchable, and with nothing to rasterise or encode. Long tables
+    # flow onto as many pages as they need.
+    # ── LEDGER ────────────────────────────────────────────────────────────────
+    ledger_cols = [("#", 50), ("Funds Used For", 220), ("Date", 105), ("Vendor Name", 195),
+                   ("Amount", 115), ("Account#", 120), ("Invoice#", 120), ("Sourced", 75)]
+    ledger_rows = [
+        [
+            (str(row_num), MUTED_C),
+            (str(fund)[:30], TEXT_C),
+            (str(dt), TEXT_C),
+            (str(vendor)[:26], TEXT_C),
+            (f"${float(amount):,.2f}", TEXT_C),
+            (str(acct), TEXT_C),
+            (str(inv), TEXT_C),
+            ("Yes", GREEN_C) if sourced else ("No", RED_C),
+        ]
+        for row_num, (fund, dt, vendor, amount, acct, inv, sourced) in enumerate(zip(
+            df["Funds Used For"], df["Date"], df["Vendor Name"], df["Amount"],
+            df["Bank Account#"], df["Invoice#"], df["Sourced"]), 1)
+    ]
+    ledger_totals = [
+        [(3, "Total Amount", TEXT_C),  (4, f"${rollup['total']:,.2f}", TEXT_C)],
+        [(3, "Total Sourced", TEXT_C), (4, f"${rollup['sourced']:,.2f}", GREEN_C)],
+    ]
+
+    # ── UOP ROLL-UP ───────────────────────────────────────────────────────────
+    uop        = rollup["uop"]
+    uop_cols   = [("#", 50), ("UOP Item", 240), ("Total Sourced", 160), ("EI Outstanding", 160),
+                  ("Total EI Available", 200), ("Fully Sourced", 130)]
+    uop_rows   = [
+        [(str(r_num), MUTED_C), (item, TEXT_C), (f"${ts:,.2f}", GREEN_C),
+         (f"${ei_out:,.2f}", RED_C if ei_out > 0 else GREEN_C), (f"${ei_avail:,.2f}", TEXT_C),
+         (fs, GREEN_C if fs == "Yes" else RED_C)]
+        for r_num, (item, ts, ei_out, ei_avail, fs) in enumerate(uop, 1)
+    ]
+    ei_total   = sum(r[2] for r in uop)
+    uop_totals = [[
+        (1, "Totals", TEXT_C),
+        (2, f"${sum(r[1] for r in uop):,.2f}", GREEN_C),
+        (3, f"${ei_total:,.2f}", GREEN_C if ei_total <= 0 else RED_C),
+        (4, f"${sum(r[3] for r in uop):,.2f}", TEXT_C),
+    ]]
+
+    ledger_layout = table_layout(len(ledger_rows), len(ledger_totals))
+    uop_layout    = table_layout(len(uop_rows), len(uop_totals))
+    n_tables      = len(ledger_layout) + len(uop_layout)
+    n_pages       = n_tables + sum(len(docs) for _, docs in inputs["items"])
+    if progress:
+        progress(0, n_pages)
+
+    tables = (
+        table_pages(
+            "Closing Equity Injection",
+            f"Loan: {loan['name']}   |   Loan Amount: ${loan['loan_amount']:,.0f}"
+            f"   |   Equity Required: ${loan['equity_required']:,.0f}",
+            ledger_cols, ledger_rows, ledger_totals, watermark, ledger_layout,
+        ),
+        table_pages(
+            "Use of Proceeds Roll-up",
+            f"Loan: {loan['name']}   |   Equity Required: ${loan['equity_required']:,.0f}",
+            uop_cols, uop_rows, uop_totals, watermark, uop_layout,
+        ),
+    )
+    done = 0
+    for pages in tables:
+        for page in pages:
+            writer.add_canvas_page(page)
+            done += 1
+            if progress:
+                progress(done, n_pages)
+
+    # Documents are read one at a time, a few pages ahead of the writer;
+    # raster pages render ahead on the process pool while vector pages are
+    # written here, and both are emitted in ledger order.
+    n_docs  = n_pages - n_tables
+    entries = deque()
+
+    def _jobs():
+        for item_label, docs in inputs["items"]:
+            for doc_type, load, closer_notes in docs:
+                try:
+                    doc_data = load() if load else None
+                except OSError:
+                    doc_data = None   # removed since the snapshot was taken
+                # PDFs have no raster path, so they are always imported page by
+                # page; a missing document is just the banner and a message
+                kind   = sniff_type(doc_data) if doc_data else None
+                job    = (doc_data, render_settings(settings, doc_type))
+                vector = settings["passthrough"] or kind == "pdf" or not doc_data
+                entries.append((vector, kind, item_label, doc_type, closer_notes, job))
+                yield None if vector else job
+
+    rendered = render_pages(_jobs(), workers, size_hint=n_docs)
+    for n, page in enumerate(rendered, n_tables + 1):
+        vector, kind, item_label, doc_type, closer_notes, job = entries.popleft()
+        if not vector:
+            _raster_page(page, item_label, doc_type, closer_notes)
+        elif not _vector_doc_pages(item_label, doc_type, job[0], closer_notes, kind, job[1]):
+            _raster_page(render_doc_page(job), item_label, doc_type, closer_notes)
+        if progress:
+            progress(n, n_pages)
+
+    writer.close()
+    return buf.getvalue()
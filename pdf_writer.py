@@ -0,0 +1,492 @@
+"""Minimal streaming PDF writer used for the closing package export.
+
+Each page is serialised to the output as soon as it is added, so the caller
+only ever holds the page it is currently rendering. The page tree, xref table
+and trailer are written on close().
+
+Source documents can be embedded without re-encoding: JPEG files are copied
+as DCT streams, 8-bit non-interlaced PNGs have their IDAT data copied as a
+Flate stream with the PNG predictor, and pages of uploaded PDFs are imported
+as form XObjects with ``pypdf``, optionally with their images re-encoded.
+Pages the caller has already encoded (JPEG, PNG or packed 1-bit) are
+embedded the same way.
+"""
+
+import io
+import struct
+import zlib
+
+# ── OBJECT NUMBERS ────────────────────────────────────────────────────────────
+CATALOG_ID = 1
+PAGES_ID   = 2
+
+PNG_SIG  = b"\x89PNG\r\n\x1a\n"
+JPEG_SIG = b"\xff\xd8"
+PDF_SIG  = b"%PDF"
+
+FONTS = {"F1": "Helvetica", "F2": "Helvetica-Bold"}
+
+
+def sniff_type(data: bytes) -> str:
+    if data[:8] == PNG_SIG:
+        return "png"
+    if data[:2] == JPEG_SIG:
+        return "jpeg"
+    if data[:1024].lstrip().startswith(PDF_SIG):
+        return "pdf"
+    return "other"
+
+
+def _rgb(color) -> str:
+    return " ".join(f"{c / 255:.3f}" for c in color)
+
+
+def _pdf_text(text: str) -> str:
+    raw = text.encode("cp1252", errors="replace").decode("latin-1")
+    return raw.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+# ── PAGE CANVAS ───────────────────────────────────────────────────────────────
+class PageCanvas:
+    """Collects vector drawing operators for one page.
+
+    Coordinates are top-left based, in points, to match the PIL drawing code
+    in the app; they are flipped to PDF space as operators are emitted.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width    = width
+        self.height   = height
+        self.xobjects = {}
+        self.fonts    = set()
+        self.alphas   = {}
+        self._ops     = []
+
+    def rect(self, x0, y0, x1, y1, fill):
+        self._ops.append(
+            f"{_rgb(fill)} rg {x0:.2f} {self.height - y1:.2f} "
+            f"{x1 - x0:.2f} {y1 - y0:.2f} re f"
+        )
+
+    def line(self, x0, y0, x1, y1, color, width: float = 1):
+        self._ops.append(
+            f"{_rgb(color)} RG {width:g} w {x0:.2f} {self.height - y0:.2f} m "
+            f"{x1:.2f} {self.height - y1:.2f} l S"
+        )
+
+    def text(self, x, y, text: str, size: float, fill, bold: bool = False):
+        # PIL positions text by its top edge; the baseline sits ~0.8em below it
+        font = "F2" if bold else "F1"
+        self.fonts.add(font)
+        base = self.height - y - size * 0.8
+        self._ops.append(
+            f"q BT /{font} {size:g} Tf {_rgb(fill)} rg {x:.2f} {base:.2f} Td "
+            f"({_pdf_text(text)}) Tj ET Q"
+        )
+
+    def image(self, obj_id: int, x, y, w, h):
+        name = f"Im{len(self.xobjects)}"
+        self.xobjects[name] = obj_id
+        self._ops.append(
+            f"q {w:.2f} 0 0 {h:.2f} {x:.2f} {self.height - y - h:.2f} cm /{name} Do Q"
+        )
+
+    def form(self, obj_id: int, x, y, scale: float, form_h: float):
+        name = f"Fm{len(self.xobjects)}"
+        self.xobjects[name] = obj_id
+        # An imported page expects the default graphics state (black fill and
+        # stroke, 1pt solid lines), not whatever the banner last set
+        self._ops.append(
+            f"q 0 g 0 G 1 w [] 0 d 0 J 0 j 10 M {scale:.5f} 0 0 {scale:.5f} {x:.2f} "
+            f"{self.height - y - form_h * scale:.2f} cm /{name} Do Q"
+        )
+
+    def watermark(self, text: str, size: float = 30, fill=(180, 0, 0), alpha: float = 0.35):
+        """Tile ``text`` at 45 degrees across the page with a constant alpha."""
+        gs = f"GS{len(self.alphas)}"
+        self.alphas[gs] = alpha
+        self.fonts.add("F1")
+        # Helvetica averages ~0.55em per glyph; tiles sit ~10% apart
+        tw   = len(text) * size * 0.55
+        step = int((tw + 40) * 0.707 * 1.1)
+        ops  = [f"q /{gs} gs {_rgb(fill)} rg BT /F1 {size:g} Tf"]
+        for x in range(-step, self.width + step, step):
+            for y in range(-step, self.height + step, step):
+                ops.append(f"0.7071 0.7071 -0.7071 0.7071 {x} {y} Tm ({_pdf_text(text)}) Tj")
+        ops.append("ET Q")
+        self._ops.append("\n".join(ops))
+
+    def content(self) -> bytes:
+        return "\n".join(self._ops).encode("latin-1")
+
+    def resources(self, font_ids: dict) -> str:
+        parts = []
+        if self.xobjects:
+            xo = " ".join(f"/{n} {i} 0 R" for n, i in self.xobjects.items())
+            parts.append(f"/XObject << {xo} >>")
+        if self.fonts:
+            fo = " ".join(f"/{n} {font_ids[n]} 0 R" for n in sorted(self.fonts))
+            parts.append(f"/Font << {fo} >>")
+        if self.alphas:
+            gs = " ".join(f"/{n} << /ca {a:.3f} /CA {a:.3f} >>" for n, a in self.alphas.items())
+            parts.append(f"/ExtGState << {gs} >>")
+        return "<< " + " ".join(parts) + " >>"
+
+
+class PdfStreamWriter:
+    """Append-only PDF writer: add pages one at a time, then close()."""
+
+    def __init__(self, fp):
+        self._fp      = fp
+        self._pos     = 0
+        self._offsets = {}
+        self._next_id = PAGES_ID + 1
+        self._kids    = []
+        self._fonts   = {}
+        self._closed  = False
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+    @property
+    def page_count(self) -> int:
+        return len(self._kids)
+
+    # ── LOW-LEVEL OUTPUT ──────────────────────────────────────────────────────
+    def _write(self, data: bytes):
+        self._fp.write(data)
+        self._pos += len(data)
+
+    def _alloc(self) -> int:
+        num = self._next_id
+        self._next_id += 1
+        return num
+
+    def _write_obj(self, num: int, body):
+        if isinstance(body, str):
+            body = body.encode("latin-1")
+        self._offsets[num] = self._pos
+        self._write(f"{num} 0 obj\n".encode("latin-1") + body + b"\nendobj\n")
+
+    def _write_stream(self, num: int, entries, data: bytes):
+        if isinstance(entries, str):
+            entries = entries.encode("latin-1")
+        self._offsets[num] = self._pos
+        self._write(f"{num} 0 obj\n<< ".encode("latin-1") + entries)
+        self._write(f" /Length {len(data)} >>\nstream\n".encode("latin-1"))
+        self._write(data)
+        self._write(b"\nendstream\nendobj\n")
+
+    def _font_ids(self, names) -> dict:
+        for name in names:
+            if name not in self._fonts:
+                self._fonts[name] = self._alloc()
+                self._write_obj(
+                    self._fonts[name],
+                    f"<< /Type /Font /Subtype /Type1 /BaseFont /{FONTS[name]} "
+                    f"/Encoding /WinAnsiEncoding >>",
+                )
+        return self._fonts
+
+    # ── EMBEDDED IMAGES ───────────────────────────────────────────────────────
+    def embed_image(self, data: bytes):
+        """Copy a JPEG or PNG into the file without re-encoding it.
+
+        Returns ``(obj_id, width, height)``, or None when the file is not a
+        format that can be passed through (the caller should decode it).
+        """
+        kind = sniff_type(data)
+        if kind == "jpeg":
+            return self._embed_jpeg(data)
+        if kind == "png":
+            return self._embed_png(data)
+        return None
+
+    def embed_encoded(self, kind: str, data: bytes, width: int, height: int, mode: str = "RGB"):
+        """Embed a raster the caller has already encoded.
+
+        ``kind`` is "jpeg", "png" (8-bit, non-interlaced, no alpha) or
+        "bilevel": zlib-compressed 1-bit rows, 1 = white, as PIL mode "1"
+        packs them. Returns ``(obj_id, width, height)``.
+        """
+        return self._write_encoded(self._alloc(), kind, data, width, height, mode)
+
+    def _write_encoded(self, img_id: int, kind: str, data: bytes, width: int, height: int,
+                       mode: str = "RGB"):
+        if kind == "jpeg":
+            return self._write_jpeg(data, width, height, mode, img_id)
+        if kind == "png":
+            embedded = self._embed_png(data, img_id)
+            if embedded is None:
+                raise ValueError("PNG cannot be embedded without decoding")
+            return embedded
+        if kind == "bilevel":
+            self._write_stream(
+                img_id,
+                f"/Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                f"/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /FlateDecode",
+                data,
+            )
+            return img_id, width, height
+        raise ValueError(f"unknown raster kind {kind!r}")
+
+    def embed_pil_image(self, img, quality: int = 75):
+        """Fallback for sources that cannot be passed through: encode as JPEG."""
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality)
+        return self._write_jpeg(buf.getvalue(), img.width, img.height, img.mode)
+
+    def _embed_jpeg(self, data: bytes):
+        from PIL import Image
+        try:
+            img = Image.open(io.BytesIO(data))  # reads the header only
+        except Exception:
+            return None
+        if img.mode not in ("RGB", "L"):
+            return None
+        return self._write_jpeg(data, img.width, img.height, img.mode)
+
+    def _write_jpeg(self, data: bytes, width: int, height: int, mode: str, img_id: int = None):
+        color_space = "/DeviceGray" if mode == "L" else "/DeviceRGB"
+        img_id = self._alloc() if img_id is None else img_id
+        self._write_stream(
+            img_id,
+            f"/Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace {color_space} /BitsPerComponent 8 /Filter /DCTDecode",
+            data,
+        )
+        return img_id, width, height
+
+    def _embed_png(self, data: bytes, img_id: int = None):
+        pos, idat, palette, ihdr = 8, [], None, None
+        while pos + 8 <= len(data):
+            length, ctype = struct.unpack(">I4s", data[pos:pos + 8])
+            chunk = data[pos + 8:pos + 8 + length]
+            if ctype == b"IHDR":
+                ihdr = struct.unpack(">IIBBBBB", chunk)
+            elif ctype == b"PLTE":
+                palette = chunk
+            elif ctype == b"tRNS":
+                return None
+            elif ctype == b"IDAT":
+                idat.append(chunk)
+            elif ctype == b"IEND":
+                break
+            pos += 12 + length
+        if ihdr is None or not idat:
+            return None
+        width, height, depth, color_type, _, _, interlace = ihdr
+        if interlace or depth > 8:
+            return None
+        if color_type == 0:
+            color_space, colors = "/DeviceGray", 1
+        elif color_type == 2 and depth == 8:
+            color_space, colors = "/DeviceRGB", 3
+        elif color_type == 3 and palette:
+            color_space = f"[/Indexed /DeviceRGB {len(palette) // 3 - 1} <{palette.hex()}>]"
+            colors = 1
+        else:
+            return None  # alpha channels need decoding into an SMask
+        img_id = self._alloc() if img_id is None else img_id
+        self._write_stream(
+            img_id,
+            f"/Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace {color_space} /BitsPerComponent {depth} /Filter /FlateDecode "
+            f"/DecodeParms << /Predictor 15 /Colors {colors} "
+            f"/BitsPerComponent {depth} /Columns {width} >>",
+            b"".join(idat),
+        )
+        return img_id, width, height
+
+    # ── IMPORTED PDF PAGES ────────────────────────────────────────────────────
+    def embed_pdf_pages(self, data: bytes, recode=None) -> list:
+        """Import each page of a PDF as a form XObject.
+
+        Returns a list of ``(obj_id, width, height)``, the size of each page
+        as a viewer shows it: clipped to its CropBox and turned by /Rotate.
+        Font and other streams are copied byte for byte. So are images,
+        unless ``recode`` is given: it is called with each opaque image as a
+        PIL image and may return an embed_encoded tuple to use instead, which
+        is kept only if it is smaller than the original. Raises ImportError
+        if pypdf is missing, or the ``cryptography`` package it needs to
+        open AES-encrypted files.
+        """
+        from pypdf import PdfReader
+        from pypdf.errors import DependencyError
+        from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+        try:
+            # Encrypted files are decrypted here, with the empty user password
+            pages = list(PdfReader(io.BytesIO(data)).pages)
+        except DependencyError as e:
+            raise ImportError(f"{e} (install pypdf[crypto])") from e
+        mapping = {}
+        pending = []
+
+        def ref(obj) -> bytes:
+            key = (obj.idnum, obj.generation)
+            if key not in mapping:
+                mapping[key] = self._alloc()
+                pending.append((mapping[key], obj))
+            return f"{mapping[key]} 0 R".encode("latin-1")
+
+        def ser(obj) -> bytes:
+            if isinstance(obj, IndirectObject):
+                return ref(obj)
+            if isinstance(obj, DictionaryObject):
+                # Streams get a fresh /Length; /Parent would drag in the source page tree
+                is_stream = isinstance(obj, StreamObject)
+                body = b" ".join(
+                    ser(k) + b" " + ser(v) for k, v in obj.items()
+                    if k != "/Parent" and not (is_stream and k == "/Length")
+                )
+                return body if is_stream else b"<< " + body + b" >>"
+            if isinstance(obj, ArrayObject):
+                return b"[" + b" ".join(ser(v) for v in obj) + b"]"
+            buf = io.BytesIO()
+            obj.write_to_stream(buf)
+            return buf.getvalue()
+
+        def image_paths(resources, path=()):
+            # Images reachable from a page, keyed like ``mapping``, with the
+            # name path (through nested forms) that pypdf's page.images takes
+            xobjects = resources.get_object().get("/XObject") if resources is not None else None
+            for name, ind in (xobjects.get_object() if xobjects is not None else {}).items():
+                if not isinstance(ind, IndirectObject) or len(path) > 8:
+                    continue
+                xobj = ind.get_object()
+                if xobj.get("/Subtype") == "/Form":
+                    yield from image_paths(xobj.get("/Resources"), (*path, name))
+                elif xobj.get("/Subtype") == "/Image" and not (
+                    # masks, transparency and 1-bit scans are left as they are
+                    xobj.get("/ImageMask") or "/SMask" in xobj or "/Mask" in xobj
+                    or "/Decode" in xobj or xobj.get("/BitsPerComponent") == 1
+                ):
+                    yield (ind.idnum, ind.generation), list((*path, name))
+
+        def recoded(page, images, key, obj):
+            if key not in images:
+                return None
+            try:
+                encoded = recode(page.images[images[key]].image)
+            except Exception:
+                return None   # pypdf cannot decode every filter and colour space
+            return encoded if encoded and len(encoded[1]) < len(obj._data) else None
+
+        def flush(page, images):
+            while pending:
+                num, ind = pending.pop()
+                obj = ind.get_object()
+                encoded = recoded(page, images, (ind.idnum, ind.generation), obj) if images else None
+                if encoded:
+                    self._write_encoded(num, *encoded)
+                elif isinstance(obj, StreamObject):
+                    # _data holds the still-encoded bytes for streams read from a file
+                    self._write_stream(num, ser(obj), obj._data)
+                else:
+                    self._write_obj(num, ser(obj))
+
+        forms = []
+        for page in pages:
+            box    = page.cropbox   # pypdf falls back to the MediaBox
+            x0, y0 = float(box.left), float(box.bottom)
+            w, h   = float(box.width), float(box.height)
+            # /Rotate turns the page clockwise for display; the form matrix
+            # does the same, moving the crop box's corner to the origin
+            rotate = page.rotation % 360
+            matrix = {
+                0:   (1, 0, 0, 1, -x0, -y0),
+                90:  (0, -1, 1, 0, -y0, w + x0),
+                180: (-1, 0, 0, -1, w + x0, h + y0),
+                270: (0, 1, -1, 0, h + y0, -x0),
+            }.get(rotate, (1, 0, 0, 1, -x0, -y0))
+            if rotate in (90, 270):
+                w, h = h, w
+            contents  = page.get_contents()
+            resources = page.get("/Resources")
+            images    = dict(image_paths(resources)) if recode is not None else None
+            form_id   = self._alloc()
+            res_bytes = ser(resources) if resources is not None else b"<< >>"
+            self._write_stream(
+                form_id,
+                f"/Type /XObject /Subtype /Form /BBox [{box.left:g} {box.bottom:g} "
+                f"{box.right:g} {box.top:g}] /Matrix [{' '.join(f'{v:g}' for v in matrix)}] "
+                f"/Filter /FlateDecode /Resources ".encode("latin-1")
+                + res_bytes,
+                zlib.compress(contents.get_data() if contents is not None else b""),
+            )
+            flush(page, images)
+            forms.append((form_id, w, h))
+        return forms
+
+    # ── PAGES ─────────────────────────────────────────────────────────────────
+    def add_image_page(self, img, quality: int = 75):
+        """Encode a PIL image as JPEG and emit it as one full-bleed page."""
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality)
+        self.add_jpeg_page(buf.getvalue(), img.width, img.height, img.mode)
+
+    def add_jpeg_page(self, data: bytes, width: int, height: int, mode: str = "RGB"):
+        """Emit an already-encoded JPEG as one full-bleed page (1px = 1pt)."""
+        img_id, _, _ = self._write_jpeg(data, width, height, mode)
+        content = f"q {width} 0 0 {height} 0 0 cm /Im0 Do Q".encode("latin-1")
+        content_id = self._alloc()
+        self._write_stream(content_id, "", content)
+
+        page_id = self._alloc()
+        self._write_obj(
+            page_id,
+            f"<< /Type /Page /Parent {PAGES_ID} 0 R /MediaBox [0 0 {width} {height}] "
+            f"/Resources << /XObject << /Im0 {img_id} 0 R >> >> "
+            f"/Contents {content_id} 0 R >>",
+        )
+        self._kids.append(page_id)
+
+    def add_canvas_page(self, canvas: PageCanvas):
+        """Emit a page built from vector operators and embedded XObjects."""
+        font_ids = self._font_ids(sorted(canvas.fonts))
+        content_id = self._alloc()
+        self._write_stream(content_id, "/Filter /FlateDecode", zlib.compress(canvas.content()))
+        page_id = self._alloc()
+        self._write_obj(
+            page_id,
+            f"<< /Type /Page /Parent {PAGES_ID} 0 R "
+            f"/MediaBox [0 0 {canvas.width} {canvas.height}] "
+            f"/Resources {canvas.resources(font_ids)} /Contents {content_id} 0 R >>",
+        )
+        self._kids.append(page_id)
+
+    # ── FINISH ────────────────────────────────────────────────────────────────
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        # Objects reserved by an import that failed part-way are written as null
+        for num in range(PAGES_ID + 1, self._next_id):
+            if num not in self._offsets:
+                self._write_obj(num, "null")
+        kids = " ".join(f"{k} 0 R" for k in self._kids)
+        self._write_obj(
+            PAGES_ID, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._kids)} >>"
+        )
+        self._write_obj(CATALOG_ID, f"<< /Type /Catalog /Pages {PAGES_ID} 0 R >>")
+
+        xref_pos = self._pos
+        size = self._next_id
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for num in range(1, size):
+            lines.append(f"{self._offsets[num]:010d} 00000 n \n")
+        self._write("".join(lines).encode("latin-1"))
+        self._write(
+            f"trailer\n<< /Size {size} /Root {CATALOG_ID} 0 R >>\n"
+            f"startxref\n{xref_pos}\n%%EOF\n".encode("latin-1")
+        )
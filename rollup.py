@@ -0,0 +1,50 @@
+"""Ledger totals and Use of Proceeds roll-up.
+
+One grouped pass over the ledger produces everything the app and the package
+PDF show: the overall total, sourced and unsourced amounts, and one row per
+UOP item. No Streamlit imports, so exports and scripts can call it directly.
+"""
+
+import pandas as pd
+
+UOP_ITEMS = ["Working Capital", "Leasehold Improvements", "FF&E", "M&E", "Closing Costs"]
+
+
+def compute_rollup(df: pd.DataFrame, uop_items: list, equity_required: float) -> dict:
+    """Totals and per-UOP aggregates for a ledger.
+
+    ``uop`` rows are ``(item, sourced, outstanding, total, fully_sourced)``,
+    in ``uop_items`` order, for items that have at least one ledger entry.
+    """
+    if df.empty:
+        return {"total": 0.0, "sourced": 0.0, "unsourced": 0.0,
+                "remaining": equity_required, "uop": []}
+
+    amount  = df["Amount"].astype(float)
+    is_src  = df["Sourced"].astype(bool)
+    parts   = pd.DataFrame({
+        "total":     amount,
+        "sourced":   amount.where(is_src, 0.0),
+        "unsourced": amount.where(~is_src, 0.0),
+    })
+    sums    = parts.sum()
+
+    uop_rows = []
+    if "UOP Item" in df.columns:
+        by_uop = parts.groupby(df["UOP Item"], sort=False)[["total", "sourced"]].sum()
+        for item in uop_items:
+            if item not in by_uop.index:
+                continue
+            total       = float(by_uop.at[item, "total"])
+            sourced     = float(by_uop.at[item, "sourced"])
+            outstanding = total - sourced
+            uop_rows.append((item, sourced, outstanding, total,
+                             "Yes" if outstanding <= 0 else "No"))
+
+    return {
+        "total":     float(sums["total"]),
+        "sourced":   float(sums["sourced"]),
+        "unsourced": float(sums["unsourced"]),
+        "remaining": equity_required - float(sums["sourced"]),
+        "uop":       uop_rows,
+    }
@@ -0,0 +1,231 @@
+"""SQLite persistence for loans, ledgers, sourcing records and uploads.
+
+One database file is shared by every session in the process (and by other
+processes, thanks to WAL mode). Tables are keyed by loan and by stable row
+ID (the ledger DataFrame's index), so opening a loan reads only that loan's
+rows. Each edit in the app writes just the row or record it touched. Upload
+bytes live in the blob store; the uploads table holds only their hashes.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from blobs import BLOBS, BlobStore
+
+DB_PATH = os.environ.get(
+    "EQUITY_DB_PATH", str(Path(__file__).resolve().parent / "equity.db")
+)
+
+LOAN_FIELDS = ("loan_id", "name", "loan_amount", "equity_required")
+
+# Ledger DataFrame column -> ledger_rows column
+LEDGER_COLUMNS = {
+    "Funds Used For": "funds_used_for",
+    "Date":           "date",
+    "Vendor Name":    "vendor_name",
+    "Amount":         "amount",
+    "Bank Account#":  "bank_account",
+    "Invoice#":       "invoice_no",
+    "Sourced":        "sourced",
+    "UOP Item":       "uop_item",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS loans (
+    loan_id         TEXT PRIMARY KEY,
+    name            TEXT NOT NULL,
+    loan_amount     REAL NOT NULL,
+    equity_required REAL NOT NULL,
+    next_row_id     INTEGER NOT NULL DEFAULT 0   -- row IDs are never reused
+);
+CREATE TABLE IF NOT EXISTS ledger_rows (
+    loan_id        TEXT    NOT NULL,
+    row_id         INTEGER NOT NULL,
+    funds_used_for TEXT,
+    date           TEXT,
+    vendor_name    TEXT,
+    amount         REAL,
+    bank_account   TEXT,
+    invoice_no     TEXT,
+    sourced        INTEGER,
+    uop_item       TEXT,
+    PRIMARY KEY (loan_id, row_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sourcing (
+    loan_id TEXT    NOT NULL,
+    row_id  INTEGER NOT NULL,
+    data    TEXT    NOT NULL,
+    PRIMARY KEY (loan_id, row_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS uploads (
+    loan_id TEXT    NOT NULL,
+    account TEXT    NOT NULL,     -- '' for invoices
+    name    TEXT    NOT NULL,
+    type    TEXT,
+    sha256  TEXT    NOT NULL,     -- content lives in the blob store
+    size    INTEGER NOT NULL,
+    PRIMARY KEY (loan_id, account, name)
+);
+"""
+
+
+class LedgerStore:
+    """Thread-safe wrapper around one SQLite connection."""
+
+    def __init__(self, path: str = DB_PATH, blobs: BlobStore = BLOBS):
+        self.path  = path
+        self.blobs = blobs
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _run(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _run_many(self, statements: list):
+        """Execute ``[(sql, params), ...]`` in one transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # ── loans ──────────────────────────────────────────────────────────────────
+    def ensure_loan(self, loan_id: str, name: str, loan_amount: float,
+                    equity_required: float) -> bool:
+        """Register a loan; True if it was not in the store before."""
+        with self._lock:
+            cur = self._conn.execute(
+                f"INSERT OR IGNORE INTO loans ({', '.join(LOAN_FIELDS)}) VALUES (?, ?, ?, ?)",
+                (loan_id, name, loan_amount, equity_required),
+            )
+            return cur.rowcount == 1
+
+    def list_loans(self) -> list:
+        rows = self._run(f"SELECT {', '.join(LOAN_FIELDS)} FROM loans ORDER BY name")
+        return [dict(zip(LOAN_FIELDS, r)) for r in rows]
+
+    def get_loan(self, loan_id: str):
+        rows = self._run(f"SELECT {', '.join(LOAN_FIELDS)} FROM loans WHERE loan_id = ?", (loan_id,))
+        return dict(zip(LOAN_FIELDS, rows[0])) if rows else None
+
+    # ── ledger ─────────────────────────────────────────────────────────────────
+    def load_ledger(self, loan_id: str) -> pd.DataFrame:
+        cols = ", ".join(LEDGER_COLUMNS.values())
+        rows = self._run(
+            f"SELECT row_id, {cols} FROM ledger_rows WHERE loan_id = ? ORDER BY row_id",
+            (loan_id,),
+        )
+        df = pd.DataFrame([r[1:] for r in rows], columns=list(LEDGER_COLUMNS),
+                          index=[r[0] for r in rows])
+        df["Sourced"] = df["Sourced"].astype(bool)
+        df["Amount"]  = df["Amount"].astype(float)
+        return df
+
+    @staticmethod
+    def _row_values(row) -> tuple:
+        return (
+            str(row["Funds Used For"]), str(row["Date"]), str(row["Vendor Name"]),
+            float(row["Amount"]), str(row["Bank Account#"]), str(row["Invoice#"]),
+            int(bool(row["Sourced"])), str(row.get("UOP Item", "") or ""),
+        )
+
+    def insert_row(self, loan_id: str, row) -> int:
+        """Append a ledger row and return the row ID the store gave it.
+
+        IDs come from the loan's counter inside one write transaction, so
+        closers adding rows to the same loan at once never share an ID.
+        """
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, across processes too
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row_id = self._conn.execute(
+                    "SELECT MAX(next_row_id, (SELECT COALESCE(MAX(row_id) + 1, 0) "
+                    "FROM ledger_rows WHERE loan_id = ?)) FROM loans WHERE loan_id = ?",
+                    (loan_id, loan_id),
+                ).fetchone()[0]
+                self._conn.execute(
+                    "INSERT INTO ledger_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (loan_id, row_id, *self._row_values(row)),
+                )
+                self._conn.execute("UPDATE loans SET next_row_id = ? WHERE loan_id = ?",
+                                   (row_id + 1, loan_id))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row_id
+
+    def update_row(self, loan_id: str, row_id: int, **fields):
+        """Update ledger columns, given by their DataFrame names, e.g. ``Sourced=True``."""
+        sets   = ", ".join(f"{LEDGER_COLUMNS[k]} = ?" for k in fields)
+        values = [int(v) if isinstance(v, bool) else v for v in fields.values()]
+        self._run(
+            f"UPDATE ledger_rows SET {sets} WHERE loan_id = ? AND row_id = ?",
+            (*values, loan_id, int(row_id)),
+        )
+
+    def delete_rows(self, loan_id: str, row_ids):
+        """Delete ledger rows and their sourcing records; other rows are untouched."""
+        stmts = []
+        for row_id in row_ids:
+            for table in ("ledger_rows", "sourcing"):
+                stmts.append((f"DELETE FROM {table} WHERE loan_id = ? AND row_id = ?",
+                              (loan_id, int(row_id))))
+        self._run_many(stmts)
+
+    def replace_ledger(self, loan_id: str, df: pd.DataFrame):
+        stmts = [("DELETE FROM ledger_rows WHERE loan_id = ?", (loan_id,))]
+        for idx, row in df.iterrows():
+            stmts.append((
+                "INSERT INTO ledger_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (loan_id, int(idx), *self._row_values(row)),
+            ))
+        stmts.append((
+            "UPDATE loans SET next_row_id = MAX(next_row_id, ?) WHERE loan_id = ?",
+            (int(df.index.max()) + 1 if len(df) else 0, loan_id),
+        ))
+        self._run_many(stmts)
+
+    # ── sourcing ───────────────────────────────────────────────────────────────
+    def load_sourcing(self, loan_id: str) -> dict:
+        rows = self._run("SELECT row_id, data FROM sourcing WHERE loan_id = ?", (loan_id,))
+        return {idx: json.loads(data) for idx, data in rows}
+
+    def save_sourcing(self, loan_id: str, row_id: int, record: dict):
+        self._run(
+            "INSERT OR REPLACE INTO sourcing VALUES (?, ?, ?)",
+            (loan_id, int(row_id), json.dumps(record, sort_keys=True)),
+        )
+
+    # ── uploads ────────────────────────────────────────────────────────────────
+    def load_uploads(self, loan_id: str) -> list:
+        """Upload references for a loan, as blob-backed document dicts."""
+        rows = self._run(
+            "SELECT account, name, type, sha256, size FROM uploads WHERE loan_id = ? ORDER BY rowid",
+            (loan_id,),
+        )
+        return [
+            self.blobs.doc(digest, size, name, ftype, account or None)
+            for account, name, ftype, digest, size in rows
+        ]
+
+    def save_upload(self, loan_id: str, fd: dict):
+        """Record a reference to a blob-backed upload (see BlobStore.doc)."""
+        self._run(
+            "INSERT OR IGNORE INTO uploads VALUES (?, ?, ?, ?, ?, ?)",
+            (loan_id, fd["account"] or "", fd["name"], fd["type"], fd["sha256"], fd["size"]),
+        )
@@ -0,0 +1,212 @@
+"""Process-wide thumbnail cache shared by every session.
+
+Thumbnails are keyed by a SHA-256 of the source bytes plus the requested
+size, held as PNG bytes in an LRU bounded by total size, and written to
+``static/thumbs/`` so they survive app restarts. That folder has its own byte
+budget; the least recently used files are deleted once it is exceeded. With
+Streamlit's static file serving enabled, pages reference them by a
+content-hashed URL instead of inlining base64 data, so browsers cache them
+across reruns.
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+THUMB_CACHE_MB   = int(os.environ.get("EQUITY_THUMB_CACHE_MB", 64))
+THUMB_DISK_MB    = int(os.environ.get("EQUITY_THUMB_DISK_MB", 512))
+STATIC_DIR       = Path(__file__).resolve().parent / "static"
+# Streamlit serves <app dir>/static/ at app/static/ (server.enableStaticServing);
+# a THUMB_DIR outside it still caches, but its URLs are not served
+THUMB_DIR        = Path(os.environ.get("EQUITY_THUMB_DIR", STATIC_DIR / "thumbs"))
+THUMB_URL_PREFIX = "app/static/thumbs"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_thumbnail(data: bytes, max_w: int = 150, max_h: int = 165):
+    """Render a PNG thumbnail, or return None if the bytes are not an image."""
+    try:
+        from PIL import Image
+        img = Image.open(io.BytesIO(data))
+        img.thumbnail((max_w, max_h), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        return buf.getvalue()
+    except Exception:
+        return None
+
+
+class ThumbnailCache:
+    """Thread-safe LRU of PNG thumbnails with an optional on-disk tier.
+
+    The disk tier is an LRU too, bounded by ``disk_max_bytes``. Its order
+    starts from the files' mtimes and is refreshed on every disk hit.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir=None, disk_max_bytes: int = None):
+        self.max_bytes      = max_bytes
+        self.bytes          = 0
+        self.disk_dir       = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_bytes     = 0
+        self._thumbs        = OrderedDict()
+        self._files         = OrderedDict()   # key -> size on disk, oldest first
+        self._lock          = threading.Lock()
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._scan_disk()
+
+    def _disk_path(self, key: tuple) -> Path:
+        digest, w, h = key
+        return self.disk_dir / f"{digest}_{w}x{h}.png"
+
+    def _scan_disk(self):
+        found = []
+        for path in self.disk_dir.glob("*_*x*.png"):
+            digest, _, size = path.stem.rpartition("_")
+            w, _, h = size.partition("x")
+            try:
+                st = path.stat()
+                found.append((st.st_mtime_ns, (digest, int(w), int(h)), st.st_size))
+            except (OSError, ValueError):
+                continue
+        for _, key, size in sorted(found):
+            self._files[key] = size
+            self.disk_bytes += size
+        self._prune_disk()
+
+    def _disk_added(self, key: tuple, size: int):
+        with self._lock:
+            self.disk_bytes += size - self._files.pop(key, 0)
+            self._files[key] = size
+        self._prune_disk()
+
+    def _disk_touch(self, key: tuple):
+        with self._lock:
+            if key in self._files:
+                self._files.move_to_end(key)
+        try:
+            os.utime(self._disk_path(key))   # keeps the order across restarts
+        except OSError:
+            pass
+
+    def _prune_disk(self):
+        if self.disk_max_bytes is None:
+            return
+        evicted = []
+        with self._lock:
+            while self.disk_bytes > self.disk_max_bytes and len(self._files) > 1:
+                key, size = self._files.popitem(last=False)
+                self.disk_bytes -= size
+                evicted.append(key)
+        for key in evicted:
+            try:
+                self._disk_path(key).unlink()
+            except OSError:
+                pass
+
+    def _write_disk(self, key: tuple, png: bytes):
+        path = self._disk_path(key)
+        tmp  = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            tmp.write_bytes(png)
+            os.replace(tmp, path)
+            self._disk_added(key, len(png))
+        except OSError:
+            pass
+
+    def _remember(self, key: tuple, png: bytes):
+        with self._lock:
+            old = self._thumbs.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._thumbs[key] = png
+            self.bytes += len(png)
+            while self.bytes > self.max_bytes and self._thumbs:
+                _, evicted = self._thumbs.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def get(self, data: bytes = None, max_w: int = 150, max_h: int = 165,
+            digest: str = None, load=None):
+        """Return PNG thumbnail bytes for ``data``, or None if it is not an image.
+
+        Callers that already know the content hash can pass ``digest`` with a
+        ``load()`` callable instead of ``data``; the source is then only read
+        on a cache miss.
+        """
+        key = (digest or content_hash(data), max_w, max_h)
+        with self._lock:
+            png = self._thumbs.get(key)
+            if png is not None:
+                self._thumbs.move_to_end(key)
+                return png or None
+        if self.disk_dir is not None:
+            try:
+                png = self._disk_path(key).read_bytes()
+                self._disk_touch(key)
+            except OSError:
+                png = None
+        if png is None:
+            # Non-images are remembered as b"" so they are not retried
+            png = make_thumbnail(data if data is not None else load(), max_w, max_h) or b""
+            if png and self.disk_dir is not None:
+                self._write_disk(key, png)
+        self._remember(key, png)
+        return png or None
+
+    def url(self, data: bytes = None, max_w: int = 150, max_h: int = 165,
+            digest: str = None, load=None):
+        """Return a static URL for the thumbnail, or None if it is not an image.
+
+        The file name is the content hash, so the URL never changes for the
+        same bytes and the browser can cache it indefinitely.
+        """
+        if self.disk_dir is None:
+            raise RuntimeError("ThumbnailCache.url() needs a disk_dir")
+        key  = (digest or content_hash(data), max_w, max_h)
+        path = self._disk_path(key)
+        # Checked every time: the file may have been pruned, by this cache or
+        # by another process sharing the folder, while the PNG stayed in memory
+        if path.exists():
+            with self._lock:
+                if key in self._files:
+                    self._files.move_to_end(key)
+        else:
+            png = self.get(data, max_w, max_h, key[0], load)
+            if png is None:
+                return None
+            if not path.exists():
+                self._write_disk(key, png)
+        # Tornado-based Streamlit servers only send a long-lived Cache-Control
+        # when a "v" argument is present; newer servers revalidate by ETag.
+        return f"{THUMB_URL_PREFIX}/{path.name}?v={key[0][:16]}"
+
+    def discard(self, digests):
+        """Forget every size of the thumbnails for ``digests``, in memory and on disk."""
+        digests = set(digests)
+        with self._lock:
+            for key in [k for k in self._thumbs if k[0] in digests]:
+                self.bytes -= len(self._thumbs.pop(key))
+            for key in [k for k in self._files if k[0] in digests]:
+                self.disk_bytes -= self._files.pop(key)
+        if self.disk_dir is not None:
+            for digest in digests:
+                for path in self.disk_dir.glob(f"{digest}_*.png"):
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+
+    def clear(self):
+        with self._lock:
+            self._thumbs.clear()
+            self.bytes = 0
+
+
+THUMBNAILS = ThumbnailCache(THUMB_CACHE_MB * 1024 * 1024, THUMB_DIR, THUMB_DISK_MB * 1024 * 1024)